@@ -0,0 +1,227 @@
+"""Recorded Sirv API latencies and rate limits, and job estimates built from them.
+
+Every API call made by the app or a worker records its duration per endpoint and
+the X-RateLimit-* headers of the answer in the job queue database, so estimates
+reflect all sessions and workers of an account. Recording only buffers the sample;
+a background thread writes the buffer in one transaction every few seconds, so a
+busy or locked database never holds up an API call.
+"""
+import os
+import math
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from contextlib import contextmanager
+from job_queue import DEFAULT_DB_PATH
+from sirv_api import TOKEN_EXPIRY
+
+# Weight of a new sample in the running latency average, once there are enough samples
+LATENCY_SMOOTHING = 0.1
+# Assumed latencies until an endpoint has been timed on this account
+DEFAULT_LATENCIES = {'files/readdir': 0.5, 'files/mkdir': 0.5, 'files/rename': 0.5, 'token': 0.5}
+DEFAULT_CONVERT_LATENCY = 20.0
+# Buffered samples are written at most this many seconds after the call
+FLUSH_INTERVAL = float(os.getenv("SIRV_STATS_FLUSH_SECONDS", "5"))
+# Samples kept while the database can't be written, the oldest are dropped first
+MAX_BUFFERED = 10000
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_latency (
+    account TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    mean_seconds REAL NOT NULL,
+    max_seconds REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, endpoint)
+);
+CREATE TABLE IF NOT EXISTS api_rate_limits (
+    account TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    limit_calls INTEGER NOT NULL,
+    remaining INTEGER NOT NULL,
+    reset_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, endpoint)
+);
+"""
+
+def api_endpoint(url):
+    """The endpoint of a Sirv API URL, e.g. files/spin2msc360 for .../v2/files/spin2msc360?x=1."""
+    path = urlparse(url).path
+    return path.split('/v2/', 1)[-1].strip('/')
+
+def parse_rate_limit(headers):
+    """Read X-RateLimit-* headers into a dict, or None when the answer has none."""
+    limit = headers.get('X-RateLimit-Limit')
+    remaining = headers.get('X-RateLimit-Remaining')
+    if limit is None or remaining is None:
+        return None
+    try:
+        rate_limit = {'limit': int(limit), 'remaining': int(remaining), 'reset_at': None}
+        if headers.get('X-RateLimit-Reset'):
+            rate_limit['reset_at'] = float(headers['X-RateLimit-Reset'])
+    except ValueError:
+        return None
+    rate_limit['bucket'] = headers.get('X-RateLimit-Type') or ''
+    return rate_limit
+
+class ApiStats:
+    """Per-account latency averages and latest rate-limit state per endpoint."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=MAX_BUFFERED)
+        self.flush_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        threading.Thread(target=self._flush_loop, name="api-stats-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, account, url, seconds, headers=None):
+        """Buffer one API call's duration and the rate limits its answer reported."""
+        self.buffer.append((account, api_endpoint(url), seconds, parse_rate_limit(headers or {}), time.time()))
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write the buffered samples in one transaction; on failure they are dropped and logged."""
+        with self.flush_lock:
+            samples = []
+            while self.buffer:
+                samples.append(self.buffer.popleft())
+            if not samples:
+                return
+            try:
+                self._write(samples)
+            except Exception as e:
+                log.warning("Could not record %d API call timings: %s", len(samples), e)
+
+    def _write(self, samples):
+        latencies = {}
+        with self._connect() as conn:
+            for account, endpoint, seconds, rate_limit, recorded_at in samples:
+                latency = latencies.get((account, endpoint))
+                if latency is None:
+                    row = conn.execute(
+                        "SELECT samples, mean_seconds, max_seconds FROM api_latency WHERE account = ? AND endpoint = ?",
+                        (account, endpoint)
+                    ).fetchone()
+                    latency = dict(row) if row else {'samples': 0, 'mean_seconds': 0.0, 'max_seconds': 0.0}
+                    latencies[(account, endpoint)] = latency
+                latency['samples'] += 1
+                # Plain average for the first samples, then a moving average that follows drift
+                weight = max(1 / latency['samples'], LATENCY_SMOOTHING)
+                latency['mean_seconds'] += weight * (seconds - latency['mean_seconds'])
+                latency['max_seconds'] = max(latency['max_seconds'], seconds)
+                latency['updated_at'] = recorded_at
+
+                if rate_limit:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO api_rate_limits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (account, rate_limit['bucket'] or endpoint, endpoint, rate_limit['limit'],
+                         rate_limit['remaining'], rate_limit['reset_at'], recorded_at)
+                    )
+            conn.executemany(
+                "INSERT OR REPLACE INTO api_latency VALUES (?, ?, ?, ?, ?, ?)",
+                [(account, endpoint, latency['samples'], latency['mean_seconds'], latency['max_seconds'],
+                  latency['updated_at']) for (account, endpoint), latency in latencies.items()]
+            )
+
+    def latencies(self, account):
+        """{endpoint: {'samples', 'mean_seconds', 'max_seconds'}} for an account."""
+        self.flush()
+        with self._connect() as conn:
+            return {row['endpoint']: dict(row) for row in conn.execute(
+                "SELECT endpoint, samples, mean_seconds, max_seconds FROM api_latency WHERE account = ?", (account,)
+            )}
+
+    def rate_limits(self, account):
+        """{endpoint: {'bucket', 'limit_calls', 'remaining', 'reset_at', 'updated_at'}} for an account."""
+        self.flush()
+        with self._connect() as conn:
+            return {row['endpoint']: dict(row) for row in conn.execute(
+                "SELECT * FROM api_rate_limits WHERE account = ?", (account,)
+            )}
+
+def estimate_job(latencies, rate_limits, convert_calls, concurrency=1, folder_checks=None):
+    """Predict wall-clock seconds and API calls of a bulk job, and whether it fits the rate limits.
+
+    convert_calls is {conversion endpoint: rows}, with several endpoints for a
+    mixed-platform job. Each row makes a conversion and a rename call; folder_checks
+    is the number of readdir calls (default one per endpoint, i.e. once per job).
+    Endpoints without recorded timings fall back to DEFAULT_LATENCIES and are listed
+    in 'assumed'.
+    """
+    concurrency = max(1, concurrency)
+    rows = sum(convert_calls.values())
+    calls = dict(convert_calls)
+    calls['files/rename'] = rows
+    calls['files/readdir'] = len(convert_calls) if folder_checks is None else folder_checks
+
+    assumed = []
+    def latency(endpoint):
+        if endpoint in latencies:
+            return latencies[endpoint]['mean_seconds']
+        assumed.append(endpoint)
+        return DEFAULT_LATENCIES.get(endpoint, DEFAULT_CONVERT_LATENCY)
+
+    busy_seconds = sum(count * latency(endpoint) for endpoint, count in calls.items())
+    seconds = busy_seconds / concurrency
+    # Tokens expire every few minutes and every worker holds its own
+    calls['token'] = concurrency * (1 + math.floor(seconds / TOKEN_EXPIRY))
+
+    # Endpoints reporting the same X-RateLimit-Type share one quota, the latest answer holds its state
+    latest = {}
+    for rate_limit in rate_limits.values():
+        known = latest.get(rate_limit['bucket'])
+        if known is None or rate_limit['updated_at'] > known['updated_at']:
+            latest[rate_limit['bucket']] = rate_limit
+
+    now = time.time()
+    buckets = {}
+    for endpoint, count in calls.items():
+        if endpoint not in rate_limits:
+            continue
+        rate_limit = latest[rate_limits[endpoint]['bucket']]
+        bucket = buckets.setdefault(rate_limit['bucket'], {
+            'bucket': rate_limit['bucket'], 'calls': 0, 'limit': rate_limit['limit_calls'],
+            'remaining': rate_limit['remaining'], 'reset_at': rate_limit['reset_at']
+        })
+        bucket['calls'] += count
+        # The window may have been reset since the headers were seen
+        if bucket['reset_at'] and bucket['reset_at'] < now:
+            bucket['remaining'] = bucket['limit']
+            bucket['reset_at'] = None
+    for bucket in buckets.values():
+        bucket['fits'] = bucket['calls'] <= bucket['remaining']
+
+    return {
+        'seconds': seconds,
+        'calls': calls,
+        'total_calls': sum(calls.values()),
+        'buckets': list(buckets.values()),
+        'fits': all(bucket['fits'] for bucket in buckets.values()),
+        'assumed': sorted(set(assumed))
+    }
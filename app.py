@@ -1,20 +1,118 @@
 import os
+import io
+import csv
 import requests
+import re
 import json
 import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import functools
+import threading
+import uuid
+import secrets
 import streamlit as st
+from collections import deque
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import urlparse, unquote
 from dotenv import load_dotenv, set_key, find_dotenv
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_local_storage import LocalStorage
 
-# Initialize local storage
-localStorage = LocalStorage()
-
-# Load environment variables (keeping this for backward compatibility)
+# Load environment variables before the helper modules below read their settings
 dotenv_path = find_dotenv(raise_error_if_not_found=False)
 if dotenv_path:
     load_dotenv(dotenv_path)
 
+from job_queue import JobQueue
+from sync_state import SyncState, utc_now_mtime, find_changed_mappings, resync_watermark
+from session_history import HISTORY_MEMORY_SIZE, HistoryRecord, SessionHistory, deep_sizeof
+from api_stats import ApiStats, estimate_job
+from circuit_breaker import BreakerBoard
+from sirv_api import PLATFORMS, find_platform, identifier_problem, conversion_endpoints, output_folders
+from sirv_async import ASYNC_CONCURRENCY, AsyncSirvClient, SyncSirvFacade
+
+# Rerun profiling (opt-in via SIRV_PROFILE=1 or the sidebar toggle)
+PROFILE_HISTORY_SIZE = 50
+profiling_enabled = os.getenv("SIRV_PROFILE", "") == "1" or st.session_state.get("profile_reruns", False)
+# Module globals are rebuilt on every rerun, so this only ever holds the current rerun
+rerun_profile = {
+    'started': time.perf_counter(),
+    'sections': {},
+    'helpers': {},
+    'network_calls': 0
+}
+
+def _record_timing(bucket, name, elapsed):
+    """Accumulate call count and elapsed time for a profiled section or helper."""
+    entry = rerun_profile[bucket].setdefault(name, {'calls': 0, 'seconds': 0.0})
+    entry['calls'] += 1
+    entry['seconds'] += elapsed
+
+@contextmanager
+def profile_section(name):
+    """Time a top-level section of the script when profiling is enabled."""
+    if not profiling_enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_timing('sections', name, time.perf_counter() - start)
+
+def is_fragment_rerun():
+    """Whether the running fragment is what this script run reruns (not the whole script)."""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run and ctx.current_fragment_id in ctx.fragment_ids_this_run)
+
+def profiled_fragment(name):
+    """Decorator that times a fragment as a section, and records fragment-only reruns as reruns.
+
+    Fragment reruns skip the rest of the script and can't write to the sidebar, so
+    their breakdown is shown at the bottom of the fragment instead of the panel.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiling_enabled or not is_fragment_rerun():
+                with profile_section(name):
+                    return func(*args, **kwargs)
+            # Module globals still hold the last full run's profile, start a fresh one
+            rerun_profile.update(started=time.perf_counter(), sections={}, helpers={}, network_calls=0)
+            with profile_section(name):
+                result = func(*args, **kwargs)
+            run = record_rerun_profile(name)
+            st.caption(f"Profile of this {name} rerun: {run['total_ms']:.0f} ms, "
+                       f"{run['network_calls']} network calls"
+                       + "".join(f", {helper} {entry['calls']}× {entry['seconds'] * 1000:.0f} ms"
+                                 for helper, entry in rerun_profile['helpers'].items()))
+            return result
+        return wrapper
+    return decorator
+
+def profiled(func):
+    """Decorator that times an API helper when profiling is enabled."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiling_enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record_timing('helpers', func.__name__, time.perf_counter() - start)
+    return wrapper
+
+def count_network_call(endpoint):
+    """Count a Sirv API call towards the rerun profile (called on the client's loop thread)."""
+    rerun_profile['network_calls'] += 1
+
 # App title and description
 st.set_page_config(
     page_title="Sirv Spin Conversion Tools",
@@ -37,37 +135,43 @@ different platforms like MSC, Amazon, Grainger, Walmart, Home Depot, and Lowe's.
 
 # Sidebar for authentication
 st.sidebar.header("Authentication")
-# Helper function to format Sirv Account URL
-def format_account_url(url):
-    url = url.strip()
-    if not url:
-        return ""
-    if url.startswith("https://"):
-        return url
-    return "https://" + url
+
+# Initialize local storage once the page shell is out, its first read needs a browser round trip
+with profile_section("Local storage init"):
+    localStorage = LocalStorage()
+
 # Check if credentials are in localStorage, if not fall back to env vars
-try:
-    if 'client_id' not in st.session_state: # Initialize in session state if not present
-        st.session_state.client_id = localStorage.getItem("sirv_client_id")
-        if st.session_state.client_id is None:
-            st.session_state.client_id = os.getenv("SIRV_CLIENT_ID", "")
-    client_id = st.session_state.client_id # Use session state for client_id
-except Exception as e:
-    st.session_state.client_id = os.getenv("SIRV_CLIENT_ID", "") # Initialize even on error
-    client_id = st.session_state.client_id
-
-try:
-    if 'client_secret' not in st.session_state: # Initialize in session state if not present
-        st.session_state.client_secret = localStorage.getItem("sirv_client_secret")
-        if st.session_state.client_secret is None:
-            st.session_state.client_secret = os.getenv("SIRV_CLIENT_SECRET", "")
-    client_secret = st.session_state.client_secret # Use session state for client_secret
-except Exception as e:
-    st.session_state.client_secret = os.getenv("SIRV_CLIENT_SECRET", "") # Initialize even on error
-    client_secret = st.session_state.client_secret
-
-# Remove account_url retrieval from storage and env, initialize it as empty
-account_url = ""
+with profile_section("Credential lookup"):
+    try:
+        if 'client_id' not in st.session_state: # Initialize in session state if not present
+            st.session_state.client_id = localStorage.getItem("sirv_client_id")
+            if st.session_state.client_id is None:
+                st.session_state.client_id = os.getenv("SIRV_CLIENT_ID", "")
+        client_id = st.session_state.client_id # Use session state for client_id
+    except Exception as e:
+        st.session_state.client_id = os.getenv("SIRV_CLIENT_ID", "") # Initialize even on error
+        client_id = st.session_state.client_id
+
+    try:
+        if 'client_secret' not in st.session_state: # Initialize in session state if not present
+            st.session_state.client_secret = localStorage.getItem("sirv_client_secret")
+            if st.session_state.client_secret is None:
+                st.session_state.client_secret = os.getenv("SIRV_CLIENT_SECRET", "")
+        client_secret = st.session_state.client_secret # Use session state for client_secret
+    except Exception as e:
+        st.session_state.client_secret = os.getenv("SIRV_CLIENT_SECRET", "") # Initialize even on error
+        client_secret = st.session_state.client_secret
+
+# The account URL is fetched from Sirv once per client ID and cached in session state,
+# so reruns (and fragment reruns) don't have to look it up again
+account_url = st.session_state.get('account_urls', {}).get(client_id, "")
+
+def remember_account_url(url):
+    """Cache the fetched account URL for the current client ID."""
+    global account_url
+    account_url = url
+    if url:
+        st.session_state.setdefault('account_urls', {})[client_id] = url
 
 # Function to save credentials to localStorage
 def save_credentials_to_local_storage(client_id, client_secret):
@@ -113,213 +217,167 @@ else:
             </script>
         """) # Force full page reload
 
-# Initialize session state for token management
-if 'token' not in st.session_state:
-    st.session_state.token = ""
-if 'token_timestamp' not in st.session_state:
-    st.session_state.token_timestamp = 0
-if 'conversion_results' not in st.session_state:
-    # Try to load conversion history from localStorage
+# Initialize session state
+with profile_section("Session state init"):
+    if 'selected_spin' not in st.session_state:
+        st.session_state.selected_spin = ""
+    if 'manual_spin_urls' not in st.session_state:
+        st.session_state.manual_spin_urls = []
+    if 'selected_manual_spin' not in st.session_state:
+        st.session_state.selected_manual_spin = ""
+    if 'spin_selection_method' not in st.session_state:
+        st.session_state.spin_selection_method = "account"
+    if 'profile_history' not in st.session_state:
+        st.session_state.profile_history = deque(maxlen=PROFILE_HISTORY_SIZE)
+# The conversion history is only parsed when something needs it (the History view,
+# a finished conversion), not on every session's first page
+def get_history():
+    """The session's conversion history, loaded from localStorage on first use."""
+    if 'conversion_results' not in st.session_state:
+        # Try to load conversion history from localStorage
+        records = []
+        try:
+            saved_history = localStorage.getItem("conversion_history")
+            if saved_history is not None and saved_history != "undefined":
+                try:
+                    # Parse JSON string back into compact history records
+                    records = [HistoryRecord.from_dict(entry) for entry in json.loads(saved_history)]
+                except (json.JSONDecodeError, TypeError, AttributeError):
+                    records = []
+        except Exception as e:
+            # If any error occurs loading from localStorage, start with an empty history
+            records = []
+        # Older entries than fit in memory are kept in the database under this browser's key
+        history_key = localStorage.getItem("history_key")
+        if not history_key:
+            history_key = uuid.uuid4().hex
+            st.session_state.history_dirty = True
+        st.session_state.conversion_results = SessionHistory(history_key, records)
+    return st.session_state.conversion_results
+
+@profiled
+def fetch_account_url():
+    """Fetch the cdnURL from the Sirv account details."""
     try:
-        saved_history = localStorage.getItem("conversion_history")
-        if saved_history is not None and saved_history != "undefined":
-            try:
-                # Parse JSON string back into list of dictionaries
-                st.session_state.conversion_results = json.loads(saved_history)
-            except json.JSONDecodeError:
-                st.session_state.conversion_results = []
-        else:
-            st.session_state.conversion_results = []
+        return sirv_client().account_url()
     except Exception as e:
-        # If any error occurs loading from localStorage, start with an empty list
-        st.session_state.conversion_results = []
-if 'selected_spin' not in st.session_state:
-    st.session_state.selected_spin = ""
-if 'manual_spin_urls' not in st.session_state:
-    st.session_state.manual_spin_urls = []
-if 'selected_manual_spin' not in st.session_state:
-    st.session_state.selected_manual_spin = ""
-if 'spin_selection_method' not in st.session_state:
-    st.session_state.spin_selection_method = "account"
-if 'bulk_conversion_data' not in st.session_state:
-    st.session_state.bulk_conversion_data = []
-def fetch_account_url():
-    """Fetch the cdnURL from the Sirv account details using the current token."""
-    sirvurl = 'https://api.sirv.com/v2/account'
-    headers = {
-        'authorization': f'Bearer {st.session_state.token}',
-        'content-type': 'application/json'
-    }
-    response = requests.get(sirvurl, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        if 'cdnURL' in data:
-            return format_account_url(data['cdnURL'])
-        elif 'cdnTempURL' in data:
-            return format_account_url(data['cdnTempURL'])
-        else:
-            return ""
-    else:
-        st.error(f"Error fetching account details: {response.status_code} - {response.text}")
+        st.error(f"Error fetching account details: {e}")
         return ""
 # Token management functions
-TOKEN_EXPIRY = 4.5 * 60  # 4.5 minutes in seconds (token expires after 5 minutes)
-
+@profiled
 def get_token():
-    """Get a fresh token if current one is expired or doesn't exist."""
-    current_time = time.time()
-
-    # If token is expired or doesn't exist, get a new one
-    if (not st.session_state.token or
-        current_time - st.session_state.token_timestamp > TOKEN_EXPIRY):
-        sirvurl = 'https://api.sirv.com/v2/token'
-        payload = {
-            'clientId': client_id,
-            'clientSecret': client_secret
-        }
-        headers = {'content-type': 'application/json'}
-        response = requests.request(
-            'POST', sirvurl, data=json.dumps(payload), headers=headers
-        )
-
-        if response.status_code == 200:
-            st.session_state.token = response.json()['token']
-            st.session_state.token_timestamp = current_time
-            global account_url
-            if not account_url:
-                account_url = fetch_account_url()
-            return True
-        else:
-            st.error(f"Error getting token: {response.status_code} - {response.text}")
-            return False
-    return True
-
-def check_folder(folder_path):
-    """Check if a folder exists, create it if not."""
-    if not get_token():
-        return False
-
-    sirvurl = f'https://api.sirv.com/v2/files/readdir?dirname={folder_path}'
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('GET', sirvurl, headers=headers)
-
-    if response.status_code == 200:
-        return True
-    else:
-        return create_folder(folder_path)
-
-def create_folder(folder_path):
-    """Create a folder in Sirv account."""
-    if not get_token():
+    """Make sure the account's shared client holds a valid token, reporting why not."""
+    try:
+        sirv_client().get_token()
+    except Exception as e:
+        st.error(f"Error getting token: {e}")
         return False
+    if not account_url:
+        remember_account_url(fetch_account_url())
+    return True
 
-    sirvurl = f'https://api.sirv.com/v2/files/mkdir?dirname={folder_path}'
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, headers=headers)
-
-    if response.status_code == 200:
-        st.success(f"Created folder: {folder_path}")
-        return True
-    else:
-        st.error(f"Error creating folder: {response.status_code} - {response.text}")
-        return False
+@profiled
+def get_spins(search_query='', max_results=1000, modified_since=None, with_mtime=False):
+    """Get list of spin files from Sirv account using search API.
 
-def get_spins(search_query='', max_results=1000):
-    """Get list of spin files from Sirv account using search API."""
-    if not get_token():
+    modified_since (an ISO 8601 timestamp) limits the search to spins modified after
+    it. With with_mtime, (filename, mtime) pairs are returned instead of filenames.
+    """
+    try:
+        return sirv_client().search_spins(search_query, max_results, modified_since, with_mtime)
+    except Exception as e:
+        st.error(f"Error fetching spins: {e}")
         return []
 
-    spins = []
-
-    # Construct the base search query to exclude trash
-    base_query = '-dirname:\\/.Trash'
-
-    # Add the user's search query if provided
-    if search_query:
-        search_query = f'{search_query} AND extension:.spin AND {base_query}'
+# A new session's token, account URL and spin listing are fetched in the background
+# on the shared asyncio client while the page renders
+PREFETCH_TIMEOUT = 60  # seconds
+
+def start_prefetch():
+    """Start fetching what the default "Select from account" view needs, once per session."""
+    if not client_id or not client_secret or 'prefetch' in st.session_state:
+        return
+    client = sirv_client()
+    st.session_state.prefetch = client.submit(client.client.prefetch())
+
+def adopt_prefetch():
+    """Wait for this session's prefetch, if any, and take over its account URL and spin listing.
+
+    Falls back silently: whatever the prefetch didn't deliver is fetched as usual.
+    """
+    future = st.session_state.get('prefetch')
+    if future is None:
+        return
+    st.session_state.prefetch = None
+    try:
+        prefetched = future.result(timeout=PREFETCH_TIMEOUT)
+    except Exception:
+        return
+    if not account_url:
+        remember_account_url(prefetched['account_url'])
+    if prefetched['spins']:
+        cache = st.session_state.setdefault('spins_cache', {})
+        cache[(client_id, '')] = {'timestamp': time.time(), 'spins': prefetched['spins']}
+
+# Spin listings are cached per client ID and search query so reruns don't repeat the search
+SPIN_CACHE_TTL = 5 * 60  # seconds
+SPIN_CACHE_MAX_QUERIES = 5
+
+def get_cached_spins(search_query=''):
+    """Return the spin list for a search query, only calling the search API when it changed or expired."""
+    cache = st.session_state.setdefault('spins_cache', {})
+    cache_key = (client_id, search_query)
+    cached = cache.get(cache_key)
+    if cached and time.time() - cached['timestamp'] < SPIN_CACHE_TTL:
+        return cached['spins']
+
+    spins = get_spins(search_query=search_query)
+    if spins:
+        cache[cache_key] = {'timestamp': time.time(), 'spins': spins}
+        # Keep only the most recent searches in session memory
+        while len(cache) > SPIN_CACHE_MAX_QUERIES:
+            del cache[min(cache, key=lambda key: cache[key]['timestamp'])]
+    return spins
+
+def clear_spin_cache():
+    """Forget cached spin listings so the next render searches again."""
+    st.session_state.spins_cache = {}
+
+# Canonicalize a spin URL or path the way it is sent to the Sirv API
+def normalize_spin_path(spin_url, allow_foreign_urls=True):
+    """Turn a spin URL or path into a canonical /path/to/file.spin, or None if it can't be used.
+
+    Strips an @ prefix, reduces account URLs (and other URLs if allow_foreign_urls)
+    to their decoded path without query string, and adds the .spin suffix if missing.
+    """
+    spin_url = spin_url.strip()
+    # First, remove any @ prefix if present
+    if spin_url.startswith('@'):
+        spin_url = spin_url[1:]
+
+    # If the URL includes the account URL, extract just the path
+    if account_url and spin_url.startswith(account_url):
+        path = unquote(urlparse(spin_url).path)
+    # If it's already a path starting with /, use it as is
+    elif spin_url.startswith('/'):
+        path = spin_url
+    # If it's a full URL, extract the path portion after the domain
+    elif spin_url.startswith('http'):
+        if not allow_foreign_urls:
+            return None
+        path = unquote(urlparse(spin_url).path)
+    # Otherwise, assume it's a path and add the leading /
     else:
-        search_query = f'extension:.spin AND {base_query}'
-
-    payload = {
-        'query': search_query,
-        'sort': {'filename.raw': 'asc'},
-        'from': 0,
-        'size': 100  # Fetch in batches of 100
-    }
-
-    # If we potentially need more than 1000 results, use scroll API
-    if max_results > 1000:
-        payload['scroll'] = True
-
-    sirvurl = 'https://api.sirv.com/v2/files/search'
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-
-    response = requests.request(
-        'POST', sirvurl, headers=headers, data=json.dumps(payload)
-    )
-
-    if response.status_code == 200:
-        results = response.json()
-
-        # Process initial results
-        if 'hits' in results and results['hits']:
-            for hit in results['hits']:
-                if '_source' in hit and 'filename' in hit['_source']:
-                    filename = hit['_source']['filename']
-                    if filename.endswith('.spin'):
-                        spins.append(filename)
-
-        total_found = results.get('total', 0)
+        path = f"/{spin_url}"
 
-        # If we need more results and scroll is supported
-        if len(spins) < total_found and len(spins) < max_results and 'scrollId' in results:
-            scroll_id = results['scrollId']
+    # Collapse repeated slashes, e.g. from an account URL with a trailing slash
+    path = re.sub(r'/{2,}', '/', path)
 
-            # Continue scrolling until we have all results or hit max_results
-            while len(spins) < total_found and len(spins) < max_results:
-                if not get_token():  # Refresh token if needed
-                    break
+    # Validate that it's a spin file
+    if not path.endswith('.spin'):
+        path = f"{path}.spin" if not path.endswith('/') else f"{path}spin.spin"
 
-                scroll_url = 'https://api.sirv.com/v2/files/search/scroll'
-                scroll_payload = {'scrollId': scroll_id}
-
-                scroll_response = requests.request(
-                    'POST', scroll_url, headers=headers, data=json.dumps(scroll_payload)
-                )
-
-                if scroll_response.status_code != 200:
-                    break
-
-                scroll_results = scroll_response.json()
-
-                if 'hits' not in scroll_results or not scroll_results['hits']:
-                    break
-
-                for hit in scroll_results['hits']:
-                    if '_source' in hit and 'filename' in hit['_source']:
-                        filename = hit['_source']['filename']
-                        if filename.endswith('.spin'):
-                            spins.append(filename)
-
-                # Update scroll_id for next iteration if available
-                if 'scrollId' in scroll_results:
-                    scroll_id = scroll_results['scrollId']
-                else:
-                    break
-
-        return spins
-    else:
-        st.error(f"Error fetching spins: {response.status_code} - {response.text}")
-        return []
+    return path
 
 def process_manual_spin_urls(text_input):
     """Process manual spin URLs/paths from text input."""
@@ -332,31 +390,26 @@ def process_manual_spin_urls(text_input):
         if not line:
             continue
 
-        # If the URL includes the account URL, extract just the path
-        if account_url and line.startswith(account_url):
-            path = line.replace(account_url, "")
-        # If it's already a path starting with /, use it as is
-        elif line.startswith('/'):
-            path = line
-        # If it's a full URL but not from the account domain, skip it
-        elif line.startswith('http'):
+        # Full URLs not from the account domain are skipped
+        path = normalize_spin_path(line, allow_foreign_urls=False)
+        if path is None:
             st.warning(f"Skipping URL not from your Sirv account domain: {line}")
             continue
-        # Otherwise, assume it's a path and add / if needed
-        else:
-            path = f"/{line}" if not line.startswith('/') else line
-
-        # Validate that it's a spin file
-        if not path.endswith('.spin'):
-            path = f"{path}.spin" if not path.endswith('/') else f"{path}spin.spin"
 
-        urls.append(path)
+        # The same spin may be entered several ways, keep it once
+        if path not in urls:
+            urls.append(path)
 
     return urls
 
-def process_bulk_conversion_data(text_input):
-    """Process bulk conversion data in format: spin_url,identifier."""
+def process_bulk_conversion_data(text_input, platform):
+    """Process bulk conversion data in format: spin_url,identifier[,platform].
+
+    Rows without a platform column are converted for the given platform. Returns
+    (bulk_data, skipped) with a message for each line that was left out.
+    """
     bulk_data = []
+    skipped = []
 
     # Split by newlines and process each line
     lines = text_input.strip().split('\n')
@@ -365,55 +418,60 @@ def process_bulk_conversion_data(text_input):
         if not line:
             continue
 
-        # Check if line contains a comma for spin_url,identifier format
-        parts = line.split(',', 1)  # Split only on the first comma
-        if len(parts) != 2:
-            st.warning(f"Line {line_num} skipped: Invalid format. Expected 'spin_url,identifier'")
+        # Check if line contains a comma for spin_url,identifier[,platform] format
+        parts = line.split(',', 1)  # Split only on the first comma, identifiers may contain commas
+        if len(parts) < 2:
+            skipped.append(f"Line {line_num} skipped: Invalid format. Expected 'spin_url,identifier'")
             continue
 
         spin_url = parts[0].strip()
         identifier = parts[1].strip()
 
+        # A last column naming a known platform targets it instead of the one selected,
+        # anything else after the first comma is part of the identifier
+        row_platform = platform
+        if ',' in identifier:
+            rest, last = identifier.rsplit(',', 1)
+            if find_platform(last.strip()):
+                row_platform = find_platform(last.strip())
+                identifier = rest.strip()
+
         if not spin_url or not identifier:
-            st.warning(f"Line {line_num} skipped: Empty spin URL or identifier")
+            skipped.append(f"Line {line_num} skipped: Empty spin URL or identifier")
             continue
 
-        # Process the spin URL to get the path
-        # First, remove any @ prefix if present
-        if spin_url.startswith('@'):
-            spin_url = spin_url[1:]
-
-        # If the URL includes the account URL, extract just the path
-        if account_url and spin_url.startswith(account_url):
-            path = spin_url.replace(account_url, "")
-        # If it's already a path starting with /, use it as is
-        elif spin_url.startswith('/'):
-            path = spin_url
-        # If it's a full URL, try to extract the path
-        elif spin_url.startswith('http'):
-            # Try to extract the path portion after the domain
-            try:
-                from urllib.parse import urlparse
-                parsed_url = urlparse(spin_url)
-                path = parsed_url.path
-            except:
-                # If parsing fails, just use the URL as is and let the API handle it
-                path = spin_url
-        # Otherwise, assume it's a path and add / if needed
-        else:
-            path = f"/{spin_url}" if not spin_url.startswith('/') else spin_url
-
-        # Validate that it's a spin file
-        if not path.endswith('.spin'):
-            path = f"{path}.spin" if not path.endswith('/') else f"{path}spin.spin"
-
         bulk_data.append({
-            'spin_path': path,
+            'platform': row_platform,
+            'spin_path': normalize_spin_path(spin_url),
             'identifier': identifier,
-            'original_url': spin_url
+            'original_url': spin_url,
+            'line': line_num
         })
 
-    return bulk_data
+    return bulk_data, skipped
+
+# Collapse duplicate bulk rows before any API calls are made
+def dedupe_bulk_data(bulk_data):
+    """Return (unique_items, duplicate_count, collisions) for parsed bulk rows.
+
+    Rows with the same platform, spin path and identifier become a single conversion.
+    An identifier mapped to different spins on one platform would make those
+    conversions overwrite each other's output zip, so all of its rows are left out
+    and reported in collisions as {(platform, identifier): [items]}.
+    """
+    unique = {}
+    items_by_output = {}
+    for item in bulk_data:
+        key = (item['platform'], item['spin_path'], item['identifier'])
+        if key in unique:
+            unique[key]['lines'].append(item['line'])
+            continue
+        unique[key] = dict(item, lines=[item['line']])
+        items_by_output.setdefault((item['platform'], item['identifier']), []).append(unique[key])
+
+    collisions = {output: items for output, items in items_by_output.items() if len(items) > 1}
+    unique_items = [item for item in unique.values() if (item['platform'], item['identifier']) not in collisions]
+    return unique_items, len(bulk_data) - len(unique), collisions
 
 def get_spin_path():
     """Get the selected spin path based on selection method."""
@@ -424,6 +482,7 @@ def get_spin_path():
         return st.session_state.selected_manual_spin
 
 # Add this function after get_spin_path() function
+@profiled
 def get_thumbnail_url(spin_path):
     """Generate a thumbnail URL for a spin."""
     # If it's already a full URL, just add ?thumb
@@ -431,11 +490,11 @@ def get_thumbnail_url(spin_path):
         return f"{spin_path}?thumb"
 
     # If it's a path and we have an account URL, combine them
-    global account_url # Ensure we are using the global account_url
     if not account_url: # If account_url is empty, fetch it
         if not get_token(): # Ensure we have a token first and refresh if needed
             return None # If no token, cannot fetch account_url, return None
-        account_url = fetch_account_url() # Fetch account_url
+        if not account_url:
+            remember_account_url(fetch_account_url()) # Fetch account_url
 
     if account_url and account_url != "": # Now check if account_url is available
         # Make sure there's no double slash between account_url and spin_path
@@ -449,294 +508,966 @@ def get_thumbnail_url(spin_path):
     # If no account_url is available, return None
     return None
 
-# API conversion functions
-def convert_to_msc(spin_path, msc_id):
-    """Convert spin to MSC format."""
-    if not get_token():
-        return None
-
-    output_folder = '/Zips-MSC/'
-    if not check_folder(output_folder):
-        return None
-
-    sirvurl = 'https://api.sirv.com/v2/files/spin2msc360'
-    payload = {'filename': spin_path, 'mscid': msc_id}
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
-
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
-
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{msc_id}.zip"):
-            return f"{account_url}{output_folder}{msc_id}.zip"
-    else:
-        st.error(f"Error generating MSC zip: {response.status_code} - {response.text}")
-    return None
-
-def convert_to_amazon(spin_path, asin):
-    """Convert spin to Amazon format."""
-    if not get_token():
-        return None
-
-    output_folder = '/Zips-Amazon/'
-    if not check_folder(output_folder):
-        return None
-
-    sirvurl = 'https://api.sirv.com/v2/files/spin2amazon360'
-    payload = {'filename': spin_path, 'asin': asin}
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
-
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
-
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{asin}.zip"):
-            return f"{account_url}{output_folder}{asin}.zip"
-    else:
-        st.error(f"Error generating Amazon zip: {response.status_code} - {response.text}")
-    return None
-
-def convert_to_grainger(spin_path, sku):
-    """Convert spin to Grainger format."""
-    if not get_token():
-        return None
-
-    output_folder = '/Zips-Grainger/'
-    if not check_folder(output_folder):
-        return None
-
-    sirvurl = 'https://api.sirv.com/v2/files/spin2grainger360'
-    payload = {'filename': spin_path, 'sku': sku}
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
-
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
-
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{sku}.zip"):
-            return f"{account_url}{output_folder}{sku}.zip"
-    else:
-        st.error(f"Error generating Grainger zip: {response.status_code} - {response.text}")
-    return None
-
-def convert_to_walmart(spin_path, gtin):
-    """Convert spin to Walmart format."""
-    if not get_token():
-        return None
-
-    output_folder = '/Zips-Walmart/'
-    if not check_folder(output_folder):
-        return None
-
-    sirvurl = 'https://api.sirv.com/v2/files/spin2walmart360'
-    payload = {'filename': spin_path, 'gtin': gtin}
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
-
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
-
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{gtin}.zip"):
-            return f"{account_url}{output_folder}{gtin}.zip"
-    else:
-        st.error(f"Error generating Walmart zip: {response.status_code} - {response.text}")
-    return None
+# Fair-share scheduling of conversions across every session on this server
+MAX_CONCURRENT_CONVERSIONS = int(os.getenv("SIRV_MAX_CONCURRENT_CONVERSIONS", "8"))
+ACCOUNT_CONCURRENCY = int(os.getenv("SIRV_ACCOUNT_CONCURRENCY", "2"))
+INTERACTIVE_RESERVED_SLOTS = 1  # server-wide slots bulk rows may not take
+
+def parse_account_limits(value):
+    """Parse per-account concurrency overrides given as "clientId=4,otherClientId=1"."""
+    limits = {}
+    for part in value.split(','):
+        account, _, limit = part.partition('=')
+        if account.strip() and limit.strip().isdigit():
+            limits[account.strip()] = int(limit)
+    return limits
+
+class ConversionTicket:
+    """A conversion waiting for, or holding, a scheduler slot."""
+    __slots__ = ('account', 'user', 'interactive', 'seq', 'granted')
+
+    def __init__(self, account, user, interactive, seq):
+        self.account = account
+        self.user = user
+        self.interactive = interactive
+        self.seq = seq
+        self.granted = False
+
+class ConversionScheduler:
+    """Hands out conversion slots fairly across accounts and the users of each account.
+
+    Interactive single conversions are always picked before bulk rows and have
+    INTERACTIVE_RESERVED_SLOTS server-wide slots bulk rows can't use. Among the
+    remaining candidates, the account (then user) with the fewest running
+    conversions wins, ties going to whoever was served least recently, so one
+    large bulk job can't starve anyone else.
+    """
+
+    def __init__(self, max_running, account_limit, account_limits=None, interactive_reserved=INTERACTIVE_RESERVED_SLOTS):
+        self.max_running = max_running
+        self.account_limit = account_limit
+        self.account_limits = account_limits or {}
+        self.interactive_reserved = min(interactive_reserved, max_running - 1)
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.running = {}
+        self.last_served = {}
+        self.total_running = 0
+        self.seq = 0
+
+    def limit_for(self, account):
+        return self.account_limits.get(account, self.account_limit)
+
+    def _eligible(self, ticket):
+        if self.running.get(ticket.account, 0) >= self.limit_for(ticket.account):
+            return False
+        capacity = self.max_running if ticket.interactive else self.max_running - self.interactive_reserved
+        return self.total_running < capacity
+
+    def _fair_order(self, ticket):
+        user_key = (ticket.account, ticket.user)
+        return (
+            self.running.get(ticket.account, 0), self.last_served.get(ticket.account, 0),
+            self.running.get(user_key, 0), self.last_served.get(user_key, 0),
+            ticket.seq
+        )
 
-def convert_to_homedepot(spin_path, omsid, spin_number=None):
-    """Convert spin to Home Depot format."""
-    if not get_token():
-        return None
+    def _dispatch(self):
+        """Grant slots to waiting tickets while capacity allows. Caller holds the lock."""
+        while True:
+            eligible = [ticket for ticket in self.waiting if self._eligible(ticket)]
+            if not eligible:
+                break
+            candidates = [ticket for ticket in eligible if ticket.interactive] or eligible
+            ticket = min(candidates, key=self._fair_order)
+            self.waiting.remove(ticket)
+            ticket.granted = True
+            now = time.monotonic()
+            for key in (ticket.account, (ticket.account, ticket.user)):
+                self.running[key] = self.running.get(key, 0) + 1
+                self.last_served[key] = now
+            self.total_running += 1
+        self.condition.notify_all()
+
+    def _release(self, ticket):
+        """Give a granted slot back, or drop a ticket that is still waiting. Caller holds the lock."""
+        if ticket.granted:
+            for key in (ticket.account, (ticket.account, ticket.user)):
+                self.running[key] -= 1
+                if not self.running[key]:
+                    del self.running[key]
+            self.total_running -= 1
+        elif ticket in self.waiting:
+            self.waiting.remove(ticket)
+        self._dispatch()
+
+    def acquire(self, account, user, interactive, on_wait=None):
+        """Block until a conversion slot is granted and return its ticket for release().
+
+        on_wait(position) is called about twice a second while queued, outside the lock.
+        """
+        with self.condition:
+            self.seq += 1
+            ticket = ConversionTicket(account, user, interactive, self.seq)
+            self.waiting.append(ticket)
+            self._dispatch()
+        try:
+            while True:
+                with self.condition:
+                    if not ticket.granted:
+                        self.condition.wait(timeout=0.5)
+                    granted = ticket.granted
+                    position = 0 if granted else self.waiting.index(ticket) + 1
+                if granted:
+                    return ticket
+                if on_wait:
+                    on_wait(position)
+        except BaseException:
+            self.release(ticket)
+            raise
+
+    def release(self, ticket):
+        """Give back a slot from acquire(); may be called from any thread."""
+        with self.condition:
+            self._release(ticket)
+
+    @contextmanager
+    def slot(self, account, user, interactive, on_wait=None):
+        """Hold a conversion slot for the with block, see acquire()."""
+        ticket = self.acquire(account, user, interactive, on_wait)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def snapshot(self):
+        """Running and queued conversions per account, for display."""
+        with self.condition:
+            accounts = {}
+            for account, count in self.running.items():
+                if isinstance(account, str):
+                    accounts.setdefault(account, {'running': 0, 'queued_interactive': 0, 'queued_bulk': 0})['running'] = count
+            for ticket in self.waiting:
+                entry = accounts.setdefault(ticket.account, {'running': 0, 'queued_interactive': 0, 'queued_bulk': 0})
+                entry['queued_interactive' if ticket.interactive else 'queued_bulk'] += 1
+            for account, entry in accounts.items():
+                entry['limit'] = self.limit_for(account)
+            return accounts
+
+@st.cache_resource
+def get_scheduler():
+    """The conversion scheduler shared by every session of this server process."""
+    return ConversionScheduler(
+        MAX_CONCURRENT_CONVERSIONS,
+        ACCOUNT_CONCURRENCY,
+        parse_account_limits(os.getenv("SIRV_ACCOUNT_CONCURRENCY_OVERRIDES", ""))
+    )
 
-    output_folder = '/Zips-HomeDepot/'
-    if not check_folder(output_folder):
-        return None
+@st.cache_resource
+def get_job_queue():
+    """The durable job queue shared with the background worker processes."""
+    return JobQueue()
+
+@st.cache_resource
+def get_async_client(client_id, client_secret):
+    """Shared asyncio client of an account, running on its own event loop thread."""
+    return SyncSirvFacade(AsyncSirvClient(client_id, client_secret, stats=get_api_stats(), breakers=get_breakers()))
+
+def sirv_client():
+    """The current account's shared client, counting its API calls towards the rerun profile."""
+    return get_async_client(client_id, client_secret).observed(count_network_call)
+
+@st.cache_resource
+def get_breakers():
+    """Circuit breakers per account and Sirv endpoint, shared by all sessions of this server."""
+    return BreakerBoard()
+
+@st.cache_resource
+def get_api_stats():
+    """Recorded API latencies and rate limits, shared with the workers through the queue database."""
+    return ApiStats()
+
+@st.cache_resource
+def get_sync_state():
+    """Tracked spin/identifier mappings for incremental re-sync, stored with the job queue."""
+    return SyncState()
+
+def get_session_id():
+    """Identify the current browser session, used as the user for fair queuing."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def scheduled(func):
+    """Decorator that runs a single conversion through the shared fair-share scheduler."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Only a conversion that actually has to wait gets a status element
+        queue_status = []
+
+        def on_wait(position):
+            if not queue_status:
+                queue_status.append(st.empty())
+            queue_status[0].caption(f"Waiting for a free conversion slot ({position} in queue)...")
 
-    sirvurl = 'https://api.sirv.com/v2/files/spin2homedepot360'
-    payload = {'filename': spin_path, 'omsid': omsid}
+        try:
+            with get_scheduler().slot(client_id, get_session_id(), interactive=True, on_wait=on_wait):
+                if queue_status:
+                    queue_status[0].empty()
+                return func(*args, **kwargs)
+        finally:
+            if queue_status:
+                queue_status[0].empty()
+    return wrapper
+
+# Single conversions run on the same engine as bulk rows, sirv_async.AsyncSirvClient.convert_and_verify
+@profiled
+@scheduled
+def convert_spin(platform, spin_path, identifier, spin_number=None):
+    """Convert a spin for a platform and verify its zip, returning the engine's result dict.
+
+    A single conversion doesn't wait for an open circuit breaker, it fails right away.
+    """
+    return sirv_client().convert_and_verify(platform, spin_path, identifier, spin_number, max_defer=0)
 
-    if spin_number:
-        payload['spinNumber'] = int(spin_number)
+# Add a result to the conversion history
+def add_result(platform, identifier, url, spin_path=None, verification=None):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if not spin_path:
+        spin_path = get_spin_path()
+    # Outcome of the post-conversion check, see AsyncSirvClient.convert_and_verify()
+    verification = verification or {}
+    result = HistoryRecord(
+        timestamp, platform, identifier, url, spin_path,
+        http_status=verification.get('http_status'),
+        content_length=verification.get('content_length'),
+        verified=verification.get('verified'),
+        problem=verification.get('problem')
+    )
+    # Add to the beginning of the history, spilling the oldest entry once memory is full
+    get_history().add(result)
 
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
+    # Saved to localStorage on the next full run, see save_history_to_local_storage()
+    st.session_state.history_dirty = True
 
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
+# Save the conversion history to localStorage
+def save_history_to_local_storage():
+    """Write the conversion history to browser localStorage if it changed.
 
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{omsid}.zip"):
-            return f"{account_url}{output_folder}{omsid}.zip"
-    else:
-        st.error(f"Error generating Home Depot zip: {response.status_code} - {response.text}")
-    return None
+    The localStorage component only reaches the browser when it is rendered as part
+    of a full script run, so fragments mark the history dirty and rerun the app.
+    """
+    if not st.session_state.get('history_dirty'):
+        return
+    try:
+        history = get_history()
+        history.flush()
+        # Only the entries kept in memory go to the browser, older ones stay in the database
+        history_json = json.dumps([record.to_dict() for record in history])
+        localStorage.setItem("conversion_history", history_json, key="save_history")
+        localStorage.setItem("history_key", history.history_key, key="save_history_key")
+        st.session_state.history_dirty = False
+    except Exception as e:
+        st.warning(f"Could not save conversion history: {str(e)}")
 
-def convert_to_lowes(spin_path, barcode):
-    """Convert spin to Lowe's format."""
-    if not get_token():
-        return None
+# Where a bulk job runs: one row at a time or concurrently in this session, or on the workers
+RUN_MODES = ["This session", "Concurrent", "Worker queue"]
 
-    output_folder = '/Zips-Lowes/'
-    if not check_folder(output_folder):
-        return None
+# Longest a bulk run waits for an open circuit breaker before failing its deferred rows
+BULK_DEFER_TIMEOUT = int(os.getenv("SIRV_BREAKER_MAX_DEFER", "600"))
 
-    sirvurl = 'https://api.sirv.com/v2/files/spin2lowes360'
-    payload = {'filename': spin_path, 'barcode': barcode}
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', sirvurl, data=json.dumps(payload), headers=headers)
+# Live results table of a bulk run, redrawn at most every STREAM_REFRESH_SECONDS
+STREAM_REFRESH_SECONDS = 1.0
+RUN_MANIFEST_FIELDS = ['platform', 'identifier', 'spin_path', 'status', 'url', 'duration_s', 'content_length', 'error']
 
-    if response.status_code == 200:
-        # Get the filename from the response
-        zip_path = response.json()['filename']
+def render_run_rows(rows, platform, manifest_dir, total=None):
+    """Show bulk rows as a table with a link to the run's CSV manifest on disk.
 
-        # Move the file to the output folder
-        if move_zip_file(zip_path, f"{output_folder}{barcode}.zip"):
-            return f"{account_url}{output_folder}{barcode}.zip"
+    total is the row count of a finished run whose first rows are given.
+    """
+    if total is None:
+        finished = sum(row['status'] in ('verified', 'flagged', 'failed') for row in rows)
+        progress = f"{finished}/{len(rows)} rows finished"
     else:
-        st.error(f"Error generating Lowe's zip: {response.status_code} - {response.text}")
-    return None
-
-def move_zip_file(from_path, to_path):
-    """Move/rename a file in Sirv account."""
-    if not get_token():
-        return False
-
-    # Remove the account URL if it's in the from_path
-    if account_url and from_path.startswith(account_url):
-        from_path = from_path.replace(account_url, "")
-
-    rename_url = f'https://api.sirv.com/v2/files/rename?from={from_path}&to={to_path}'
-    headers = {
-        'content-type': 'application/json',
-        'authorization': f'Bearer {st.session_state.token}'
-    }
-    response = requests.request('POST', rename_url, headers=headers)
-
-    if response.status_code == 200:
-        return True
+        progress = f"{total} rows"
+    if os.path.exists(os.path.join(manifest_dir, 'manifest.csv')):
+        file_name = f"sirv-{platform.lower().replace(' ', '-')}-manifest.csv"
+        st.markdown(f'<a href="{bundle_url(manifest_dir, "manifest.csv")}" download="{file_name}">'
+                    f'Download manifest CSV</a> ({progress})', unsafe_allow_html=True)
     else:
-        st.error(f"Error moving file: {response.status_code} - {response.text}")
-        return False
-
-# Add a result to the conversion history
-def add_result(platform, identifier, url, spin_path=None):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if not spin_path:
-        spin_path = get_spin_path()
-    result = {
-        "timestamp": timestamp,
-        "platform": platform,
-        "identifier": identifier,
-        "url": url,
-        "spin_path": spin_path
-    }
-    # Add to the beginning of the list
-    st.session_state.conversion_results.insert(0, result)
+        st.caption("The manifest of this run has expired.")
+    if total is not None and total > len(rows):
+        st.caption(f"Showing the first {len(rows)} of {total} rows, the manifest lists all of them.")
+    st.dataframe(
+        rows,
+        column_order=['status', 'platform', 'identifier', 'spin_path', 'url', 'duration_s', 'content_length', 'error'],
+        column_config={
+            'url': st.column_config.LinkColumn("URL"),
+            'duration_s': st.column_config.NumberColumn("Seconds", format="%.2f"),
+            'content_length': st.column_config.NumberColumn("Bytes")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
 
-    # Save updated history to localStorage
+def write_run_manifest(manifest_dir, rows):
+    """Replace a run's manifest.csv, a download in progress keeps reading the previous one."""
+    # Recreated if the directory was swept while the run sat idle
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = os.path.join(manifest_dir, 'manifest.csv')
+    with open(path + '.tmp', 'w', newline='') as manifest_file:
+        manifest_file.write(manifest_csv(rows, RUN_MANIFEST_FIELDS))
+    os.replace(path + '.tmp', path)
+
+def run_manifest_rows(manifest_dir):
+    """Rows of a run's manifest on disk, or [] once it has expired."""
     try:
-        # Convert list to JSON string
-        history_json = json.dumps(st.session_state.conversion_results)
-        localStorage.setItem("conversion_history", history_json, key="save_history")
-    except Exception as e:
-        st.warning(f"Could not save conversion history: {str(e)}")
+        with open(os.path.join(manifest_dir, 'manifest.csv'), newline='') as manifest_file:
+            return list(csv.DictReader(manifest_file))
+    except FileNotFoundError:
+        return []
 
-# Run bulk conversion for a specific platform
-def run_bulk_conversion(platform, bulk_data):
-    """Run bulk conversion for specified platform."""
-    results = []
-    successes = 0
-    failures = 0
+def bulk_results_summary(results, limit=HISTORY_MEMORY_SIZE):
+    """What the session keeps of a finished bulk run: its counts and first rows, the rest is in the manifest."""
+    flagged = [{'identifier': result['identifier'], 'problem': result['problem']}
+               for result in results['results'] if not result['verified']]
+    return {
+        'platform': results['platform'],
+        'manifest_dir': results['manifest_dir'],
+        'rows': results['rows'][:limit],
+        'total_rows': len(results['rows']),
+        'successes': results['successes'],
+        'failures': results['failures'],
+        'flagged': len(flagged),
+        'flagged_rows': flagged[:limit]
+    }
 
+class LiveResultTable:
+    """Rows of a running bulk job, redrawn in place as each one completes.
+
+    The manifest is rewritten on disk next to the bundles and linked from the static
+    route, so redraws don't pile up CSV copies in the session's media files.
+    """
+
+    def __init__(self, platform, bulk_data):
+        self.platform = platform
+        self.rows = [{
+            'platform': item['platform'], 'identifier': item['identifier'], 'spin_path': item['spin_path'],
+            'status': 'queued', 'url': '', 'duration_s': None, 'content_length': None, 'error': ''
+        } for item in bulk_data]
+        sweep_bundles()
+        self.manifest_dir = os.path.join(BUNDLE_DIR, secrets.token_urlsafe(16))
+        os.makedirs(self.manifest_dir)
+        self.placeholder = st.empty()
+        self.last_drawn = 0.0
+
+    def refresh(self, force=False):
+        """Redraw the table unless it was redrawn less than STREAM_REFRESH_SECONDS ago."""
+        now = time.monotonic()
+        if not force and now - self.last_drawn < STREAM_REFRESH_SECONDS:
+            return
+        self.last_drawn = now
+        write_run_manifest(self.manifest_dir, self.rows)
+        with self.placeholder.container():
+            render_run_rows(self.rows, self.platform, self.manifest_dir)
+
+# Bulk runs in this session: every row runs on the shared asyncio client, one at a time
+# ("This session") or up to the account's limit ("Concurrent")
+def concurrent_rows():
+    """Rows a Concurrent run keeps in flight: the account's scheduler limit, up to ASYNC_CONCURRENCY."""
+    return min(ASYNC_CONCURRENCY, get_scheduler().limit_for(client_id))
+
+def bulk_slots(waiting):
+    """Slot callback for AsyncSirvClient.run_bulk: a bulk slot of the shared scheduler per row.
+
+    The slot is taken on a worker thread of the client's loop, so the position of a
+    row that has to wait goes into waiting['position'] for this thread to show.
+    """
+    scheduler, account, user = get_scheduler(), client_id, get_session_id()
+
+    def take_slot():
+        ticket = scheduler.acquire(account, user, interactive=False,
+                                   on_wait=lambda position: waiting.update(position=position))
+        waiting['position'] = 0
+        return lambda: scheduler.release(ticket)
+    return take_slot
+
+@profiled
+def run_bulk_conversion(platform, bulk_data, concurrency):
+    """Run bulk rows on the asyncio client, streaming them into the table as they finish.
+
+    At most concurrency rows are in flight, and every one of them holds its own bulk
+    slot in the fair-share scheduler, so the job keeps to the account's concurrency
+    limit and waits behind interactive conversions. The rows run on the client's
+    loop, this thread draws the table.
+    """
     progress_bar = st.progress(0)
     status_text = st.empty()
+    table = LiveResultTable(platform, bulk_data)
+    table.refresh(force=True)
+
+    # Rows are handed over from the client's loop as they start (result None) and finish
+    events = Queue()
+    waiting = {'position': 0}
+    status_text.text("Preparing output folders...")
+    job = sirv_client().start_bulk(
+        bulk_data, slots=bulk_slots(waiting), concurrency=concurrency,
+        on_start=lambda index: events.put((index, None)),
+        on_result=lambda index, result: events.put((index, result)),
+        max_defer=BULK_DEFER_TIMEOUT
+    )
 
-    for i, item in enumerate(bulk_data):
-        spin_path = item['spin_path']
-        identifier = item['identifier']
+    job_endpoints = {endpoint for item in bulk_data for endpoint in conversion_endpoints(item['platform'])}
+    done = 0
+    while not job.done() or not events.empty():
+        try:
+            index, result = events.get(timeout=0.5)
+        except Empty:
+            index = None
+        while index is not None:
+            row = table.rows[index]
+            if result is None:
+                row['status'] = 'converting'
+            else:
+                done += 1
+                row.update(url=result['url'] or '', duration_s=result['duration_s'],
+                           content_length=result['content_length'])
+                if result['error']:
+                    row.update(status='failed', error=result['error'])
+                elif result['verified']:
+                    row.update(status='verified', error='')
+                else:
+                    row.update(status='flagged', error=f"Verification failed: {result['problem']}")
+            try:
+                index, result = events.get_nowait()
+            except Empty:
+                index = None
+        progress_bar.progress(done / len(bulk_data))
+        if get_breakers().tripped(client_id, job_endpoints):
+            status_text.text(f"{done} of {len(bulk_data)} rows done. Sirv keeps failing, "
+                             "rows wait for a probe to get through...")
+        elif waiting['position']:
+            status_text.text(f"{done} of {len(bulk_data)} rows done, waiting for a free conversion slot "
+                             f"({waiting['position']} in queue)...")
+        else:
+            status_text.text(f"{done} of {len(bulk_data)} rows done, up to {min(concurrency, concurrent_rows())} "
+                             "at a time...")
+        table.refresh()
+    results = job.result()  # raises what stopped the job
 
-        # Update progress
-        progress = (i / len(bulk_data))
-        progress_bar.progress(progress)
-        status_text.text(f"Processing {i+1} of {len(bulk_data)}: {spin_path}")
+    converted = [result for result in results if not result['error']]
+    for result in converted:
+        add_result(result['platform'], result['identifier'], result['url'], result['spin_path'], verification=result)
 
-        result_url = None
+    status_text.text("Processing complete!")
+    table.refresh(force=True)
+    return {
+        'platform': platform,
+        'results': converted,
+        'rows': table.rows,
+        'manifest_dir': table.manifest_dir,
+        'successes': sum(result['verified'] for result in converted),
+        'failures': len(results) - len(converted),
+        'flagged': sum(not result['verified'] for result in converted)
+    }
 
-        # Call the appropriate conversion function based on platform
+# Bundle downloads: fetch many result zips concurrently and stream them into one archive
+BUNDLE_WORKERS = 8  # concurrent downloads, also the size of the connection pool
+BUNDLE_SPOOL_SIZE = 8 * 1024 * 1024  # per-download bytes kept in memory before spilling to disk
+BUNDLE_CHUNK_SIZE = 256 * 1024
+MANIFEST_FIELDS = ['platform', 'identifier', 'spin_path', 'url', 'archive_path', 'size_bytes', 'sha256', 'cache', 'status', 'error']
+# Bundles are served from disk by Streamlit's static file route (server.enableStaticServing),
+# which only serves files up to 200 MB, so a bundle is split into independent zip parts
+STATIC_SERVING_MAX_BYTES = 200 * 1024 * 1024
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "bundles")
+BUNDLE_PART_BYTES = min(int(float(os.getenv("SIRV_BUNDLE_PART_MB", "190")) * 1024 * 1024), STATIC_SERVING_MAX_BYTES)
+BUNDLE_MAX_AGE = float(os.getenv("SIRV_BUNDLE_MAX_AGE_HOURS", "6")) * 3600
+
+@st.cache_resource
+def get_download_session():
+    """Shared requests session with a connection pool sized for concurrent downloads."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=BUNDLE_WORKERS, pool_maxsize=BUNDLE_WORKERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_to_spool(session, url):
+    """Stream a URL into a spooled temp file, returning (file, size, sha256 hex digest)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with session.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=BUNDLE_CHUNK_SIZE):
+                spool.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, size, digest.hexdigest()
+
+# Local disk cache of downloaded result zips, keyed by URL and revalidated with ETag/Last-Modified
+ZIP_CACHE_DIR = os.getenv("SIRV_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sirv-zip-cache"))
+ZIP_CACHE_MAX_BYTES = int(float(os.getenv("SIRV_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+class ZipCache:
+    """Content cache of result zips on disk with size-based LRU eviction.
+
+    Every cached file is stored with its SHA-256 checksum and the validators the CDN
+    sent (ETag/Last-Modified). A cached file is only served after a conditional
+    request confirms it is still current and its checksum still matches.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.index_path) as index_file:
+                self.index = json.load(index_file)
+        except (OSError, json.JSONDecodeError):
+            self.index = {}
+
+    def _file_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.zip')
+
+    def _save_index(self):
+        temp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as index_file:
+            json.dump(self.index, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def _forget(self, url):
+        entry = self.index.pop(url, None)
+        if entry:
+            try:
+                os.remove(entry['file'])
+            except OSError:
+                pass
+
+    def _evict(self, keep):
+        """Drop least recently used files, other than the one just stored, until the cache fits in max_bytes."""
+        total = sum(entry['size'] for entry in self.index.values())
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            total -= entry['size']
+            self._forget(url)
+
+    def _verify(self, cached_file, entry):
+        """Check that an open cached file still matches the checksum recorded when it was stored."""
+        digest = hashlib.sha256()
         try:
-            if platform == "MSC":
-                result_url = convert_to_msc(spin_path, identifier)
-            elif platform == "Amazon":
-                result_url = convert_to_amazon(spin_path, identifier)
-            elif platform == "Grainger":
-                result_url = convert_to_grainger(spin_path, identifier)
-            elif platform == "Walmart":
-                result_url = convert_to_walmart(spin_path, identifier)
-            elif platform == "Home Depot":
-                # For Home Depot, the identifier should be a 9-digit OMSID
-                if len(identifier) == 9:
-                    result_url = convert_to_homedepot(spin_path, identifier)
+            for chunk in iter(lambda: cached_file.read(BUNDLE_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            cached_file.seek(0)
+        except OSError:
+            return False
+        return digest.hexdigest() == entry['sha256']
+
+    def stats(self):
+        with self.lock:
+            return len(self.index), sum(entry['size'] for entry in self.index.values())
+
+    def clear(self):
+        with self.lock:
+            for url in list(self.index):
+                self._forget(url)
+            self._save_index()
+
+    def fetch(self, session, url):
+        """Return (file, size, sha256, cache_status) for a URL, downloading only if needed.
+
+        cache_status is "hit" when the CDN answered 304 Not Modified and the cached
+        file passed its checksum, or "miss" when the zip had to be downloaded.
+        """
+        with self.lock:
+            entry = self.index.get(url)
+        headers = {}
+        if entry and os.path.exists(entry['file']):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        with session.get(url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304 and entry:
+                # Opened before anything else, so a concurrent eviction can't remove it under us
+                try:
+                    cached_file = open(entry['file'], 'rb')
+                except OSError:
+                    cached_file = None
+                if cached_file and self._verify(cached_file, entry):
+                    with self.lock:
+                        entry['last_used'] = time.time()
+                        self._save_index()
+                    return cached_file, entry['size'], entry['sha256'], 'hit'
+                if cached_file:
+                    cached_file.close()
+                # Corrupted or gone on disk: drop it and fetch the zip unconditionally
+                with self.lock:
+                    self._forget(url)
+                return self.fetch(session, url)
+
+            response.raise_for_status()
+            file_path = self._file_path(url)
+            temp_path = f"{file_path}.{threading.get_ident()}.part"
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(temp_path, 'wb') as temp_file:
+                    for chunk in response.iter_content(chunk_size=BUNDLE_CHUNK_SIZE):
+                        temp_file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                expected_size = response.headers.get('Content-Length')
+                if expected_size and int(expected_size) != size and not response.headers.get('Content-Encoding'):
+                    raise IOError(f"Incomplete download of {url}: got {size} of {expected_size} bytes")
+                os.replace(temp_path, file_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+            # Opened before eviction runs, the open file stays readable even if it is removed
+            cached_file = open(file_path, 'rb')
+            with self.lock:
+                if size > self.max_bytes:
+                    # Larger than the whole cache: serve it from the open file without keeping it
+                    self._forget(url)
+                    try:
+                        os.remove(file_path)
+                    except OSError:
+                        pass
                 else:
-                    st.warning(f"Skipping Home Depot conversion for {spin_path}: ID {identifier} must be 9 digits")
-            elif platform == "Lowes":
-                result_url = convert_to_lowes(spin_path, identifier)
-        except Exception as e:
-            st.error(f"Error converting {spin_path}: {str(e)}")
-            failures += 1
+                    self.index[url] = {
+                        'file': file_path,
+                        'size': size,
+                        'sha256': digest.hexdigest(),
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'last_used': time.time()
+                    }
+                    self._evict(keep=url)
+                self._save_index()
+            return cached_file, size, digest.hexdigest(), 'miss'
+
+@st.cache_resource
+def get_zip_cache():
+    """Process-wide zip cache, or None when disabled with SIRV_CACHE_MAX_MB=0."""
+    if ZIP_CACHE_MAX_BYTES <= 0:
+        return None
+    return ZipCache(ZIP_CACHE_DIR, ZIP_CACHE_MAX_BYTES)
+
+def fetch_result_zip(session, cache, url):
+    """Fetch a result zip through the disk cache if enabled, else into a spooled temp file."""
+    if cache is not None:
+        return cache.fetch(session, url)
+    return fetch_to_spool(session, url) + ('uncached',)
+
+def bundle_archive_path(url, used_paths):
+    """Name of a result zip inside the bundle, e.g. Zips-Amazon/B00123.zip, made unique."""
+    path = urlparse(url).path.lstrip('/') or 'result.zip'
+    candidate = path
+    counter = 1
+    while candidate in used_paths:
+        root, ext = os.path.splitext(path)
+        candidate = f"{root}-{counter}{ext}"
+        counter += 1
+    used_paths.add(candidate)
+    return candidate
+
+def manifest_csv(rows, fields=MANIFEST_FIELDS):
+    """Render manifest rows as CSV text."""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+def sweep_bundles(max_age=BUNDLE_MAX_AGE):
+    """Delete bundles older than max_age seconds, whichever session built them."""
+    if not os.path.isdir(BUNDLE_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(BUNDLE_DIR):
+        path = os.path.join(BUNDLE_DIR, name)
+        # Another session's sweep may remove it in the meantime
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
             continue
 
-        if result_url:
-            successes += 1
-            results.append({
-                'spin_path': spin_path,
-                'identifier': identifier,
-                'url': result_url
-            })
-            # Add to conversion history
-            add_result(platform, identifier, result_url, spin_path)
-        else:
-            failures += 1
-
-    # Complete the progress bar
-    progress_bar.progress(1.0)
-    status_text.text("Processing complete!")
+def build_bundle(items, progress_callback=None):
+    """Download result zips concurrently and stream them into zip parts on disk.
+
+    At most BUNDLE_WORKERS downloads are in flight at a time and each one is written
+    into the current part and released as soon as it completes, so memory stays
+    bounded no matter how many zips are bundled. A new part is started before one
+    would grow past BUNDLE_PART_BYTES. The parts and manifest.csv are written to a
+    directory under BUNDLE_DIR with an unguessable name. Returns (bundle_dir,
+    part_names, manifest_rows).
+    """
+    sweep_bundles()
+    bundle_dir = os.path.join(BUNDLE_DIR, secrets.token_urlsafe(16))
+    os.makedirs(bundle_dir)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    session = get_download_session()
+    cache = get_zip_cache()
+    used_paths = set()
+    manifest = []
+    parts = []
+    pending_items = iter(items)
+    done = 0
+    bundle = None
+    part_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=BUNDLE_WORKERS) as executor:
+        in_flight = {}
+
+        def submit_next():
+            item = next(pending_items, None)
+            if item is not None:
+                in_flight[executor.submit(fetch_result_zip, session, cache, item['url'])] = item
+            return item is not None
+
+        for _ in range(BUNDLE_WORKERS):
+            if not submit_next():
+                break
 
-    return {
-        'results': results,
-        'successes': successes,
-        'failures': failures
+        try:
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = in_flight.pop(future)
+                    row = {
+                        'platform': item.get('platform', ''),
+                        'identifier': item['identifier'],
+                        'spin_path': item.get('spin_path', ''),
+                        'url': item['url'],
+                        'archive_path': '',
+                        'size_bytes': '',
+                        'sha256': '',
+                        'cache': '',
+                        'status': 'ok',
+                        'error': ''
+                    }
+                    try:
+                        zip_file, size, sha256, cache_status = future.result()
+                    except Exception as e:
+                        row['status'] = 'failed'
+                        row['error'] = str(e)
+                    else:
+                        with zip_file:
+                            if bundle is None or (part_bytes and part_bytes + size > BUNDLE_PART_BYTES):
+                                if bundle is not None:
+                                    bundle.close()
+                                parts.append(f"sirv-zips-{stamp}-part{len(parts) + 1}.zip")
+                                bundle = zipfile.ZipFile(os.path.join(bundle_dir, parts[-1]), 'w',
+                                                         compression=zipfile.ZIP_STORED, allowZip64=True)
+                                part_bytes = 0
+                            row['archive_path'] = bundle_archive_path(item['url'], used_paths)
+                            # Result zips are already compressed, store them as-is
+                            with bundle.open(row['archive_path'], 'w', force_zip64=True) as entry:
+                                shutil.copyfileobj(zip_file, entry, BUNDLE_CHUNK_SIZE)
+                            part_bytes += size
+                        row['size_bytes'] = size
+                        row['sha256'] = sha256
+                        row['cache'] = cache_status
+                    manifest.append(row)
+                    done += 1
+                    if progress_callback:
+                        progress_callback(done, row)
+                    submit_next()
+            if bundle is not None:
+                bundle.writestr('manifest.csv', manifest_csv(manifest))
+        finally:
+            if bundle is not None:
+                bundle.close()
+
+    with open(os.path.join(bundle_dir, 'manifest.csv'), 'w', newline='') as manifest_file:
+        manifest_file.write(manifest_csv(manifest))
+    return bundle_dir, parts, manifest
+
+def bundle_url(bundle_dir, name):
+    """Relative URL of a bundle file on Streamlit's static file route."""
+    return f"app/static/bundles/{os.path.basename(bundle_dir)}/{name}"
+
+def bundle_download_section(items, key):
+    """Render a "download all" button that bundles the given result zips into zip parts on disk."""
+    bundles = st.session_state.setdefault('bundles', {})
+    signature = hashlib.sha256("\n".join(item['url'] for item in items).encode()).hexdigest()
+
+    if st.button(f"Prepare bundle of all {len(items)} zips", key=f"{key}_bundle_button"):
+        previous = bundles.pop(key, None)
+        if previous:
+            shutil.rmtree(previous['dir'], ignore_errors=True)
+
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        def on_progress(done, row):
+            progress_bar.progress(done / len(items))
+            status_text.text(f"Downloaded {done} of {len(items)}: {row['identifier']}")
+
+        bundle_dir, parts, manifest = build_bundle(items, on_progress)
+        # Only what the links need stays in the session, the manifest is on disk
+        bundles[key] = {
+            'dir': bundle_dir, 'signature': signature,
+            'parts': [(name, os.path.getsize(os.path.join(bundle_dir, name))) for name in parts],
+            'total': len(manifest), 'failed': sum(row['status'] != 'ok' for row in manifest)
+        }
+        status_text.empty()
+        progress_bar.empty()
+
+    bundle = bundles.get(key)
+    if bundle and bundle['signature'] == signature and os.path.isdir(bundle['dir']):
+        if bundle['failed']:
+            st.warning(f"{bundle['failed']} of {bundle['total']} zips could not be downloaded, see the manifest for details.")
+        # Plain links: the browser downloads the files straight from disk, nothing is held in memory
+        parts = bundle['parts']
+        links = []
+        for number, (name, size) in enumerate(parts, 1):
+            label = "Download all as one archive" if len(parts) == 1 else f"Download part {number} of {len(parts)}"
+            links.append(f'<a href="{bundle_url(bundle["dir"], name)}" download="{name}">{label}</a> '
+                         f'({size / (1024 * 1024):.1f} MB)')
+        links.append(f'<a href="{bundle_url(bundle["dir"], "manifest.csv")}" download="manifest.csv">'
+                     'Download CSV manifest</a>')
+        st.markdown("<br>".join(links), unsafe_allow_html=True)
+        if any(size > STATIC_SERVING_MAX_BYTES for _, size in bundle['parts']):
+            st.warning("A zip larger than 200 MB got a part of its own that Streamlit won't serve; "
+                       "download it from its URL instead.")
+    elif bundle and not os.path.isdir(bundle['dir']):
+        st.caption("The prepared bundle has expired, prepare it again to download.")
+
+def redownload_section(results):
+    """Re-download a single zip from the history, served from the local cache when unchanged."""
+    with st.expander("Re-download a zip"):
+        choice = st.selectbox(
+            "Conversion",
+            range(len(results)),
+            format_func=lambda i: f"{results[i]['platform']} · {results[i]['identifier']} · {results[i]['timestamp']}",
+            key="redownload_choice"
+        )
+        if st.button("Fetch zip", key="redownload_fetch"):
+            result = results[choice]
+            try:
+                zip_file, size, sha256, cache_status = fetch_result_zip(get_download_session(), get_zip_cache(), result['url'])
+            except Exception as e:
+                st.error(f"Could not download {result['url']}: {str(e)}")
+            else:
+                with zip_file:
+                    st.download_button(
+                        f"Save {os.path.basename(urlparse(result['url']).path)}",
+                        data=zip_file,
+                        file_name=os.path.basename(urlparse(result['url']).path),
+                        mime="application/zip",
+                        key="redownload_save",
+                        on_click="ignore"
+                    )
+                if cache_status == 'hit':
+                    st.caption(f"Served from the local cache ({size / 1024:.0f} KB, unchanged on the CDN).")
+                else:
+                    st.caption(f"Downloaded from the CDN ({size / 1024:.0f} KB).")
+
+        cache = get_zip_cache()
+        if cache is not None:
+            cached_files, cached_bytes = cache.stats()
+            st.caption(f"Local zip cache: {cached_files} files, {cached_bytes / (1024 * 1024):.1f} MB "
+                       f"of {ZIP_CACHE_MAX_BYTES / (1024 * 1024):.0f} MB")
+            if st.button("Clear zip cache", key="clear_zip_cache"):
+                cache.clear()
+                st.rerun(scope="fragment")
+
+# Show the per-rerun timing breakdown in the sidebar
+def record_rerun_profile(scope):
+    """Add this rerun's profile to the rolling history; scope is "full" or the rerun fragment."""
+    run = {
+        'time': datetime.now().strftime("%H:%M:%S"),
+        'scope': scope,
+        'total_ms': round((time.perf_counter() - rerun_profile['started']) * 1000, 1),
+        'network_calls': rerun_profile['network_calls'],
+        'sections': {name: entry['seconds'] for name, entry in rerun_profile['sections'].items()}
     }
+    st.session_state.profile_history.append(run)
+    return run
+
+def render_profile_panel():
+    """Store this rerun's profile and render the breakdown and rolling history."""
+    total_seconds = record_rerun_profile("full")['total_ms'] / 1000
+
+    with st.sidebar.expander("Rerun profile", expanded=True):
+        st.metric("Last rerun", f"{total_seconds * 1000:.0f} ms")
+        st.metric("Network calls this rerun", rerun_profile['network_calls'])
+
+        st.markdown("**Sections**")
+        st.dataframe(
+            [{'section': name, 'ms': round(entry['seconds'] * 1000, 1)}
+             for name, entry in rerun_profile['sections'].items()],
+            hide_index=True, use_container_width=True
+        )
 
-# Main app interface
-tab1, tab2, tab3 = st.tabs(["Conversion Tools", "Bulk Conversion", "Conversion History"])
+        st.markdown("**API helpers** (inclusive time)")
+        helpers = sorted(rerun_profile['helpers'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+        if helpers:
+            st.dataframe(
+                [{'helper': name, 'calls': entry['calls'], 'ms': round(entry['seconds'] * 1000, 1)}
+                 for name, entry in helpers],
+                hide_index=True, use_container_width=True
+            )
+        else:
+            st.caption("No API helpers ran during this rerun.")
+
+        history = list(st.session_state.profile_history)
+        if len(history) > 1:
+            st.markdown(f"**Last {len(history)} reruns**")
+            st.line_chart([{'total ms': run['total_ms'], 'network calls': run['network_calls']} for run in history])
+            # Most interactions only rerun one tab fragment
+            st.dataframe(
+                [{'time': run['time'], 'rerun': run.get('scope', 'full'), 'ms': run['total_ms'],
+                  'network calls': run['network_calls']} for run in reversed(history[-10:])],
+                hide_index=True, use_container_width=True
+            )
+
+        # Approximate memory held by this session, largest keys first
+        usage = sorted(((key, deep_sizeof(value)) for key, value in st.session_state.items()),
+                       key=lambda item: item[1], reverse=True)
+        st.metric("Session memory", f"{sum(size for _, size in usage) / 1024:.0f} KB")
+        st.dataframe(
+            [{'key': key, 'KB': round(size / 1024, 1)} for key, size in usage[:10]],
+            hide_index=True, use_container_width=True
+        )
 
-with tab1:
+# Record a successful single conversion and refresh the rest of the app
+def finish_conversion(result):
+    """Add a converted and checked zip to the history and rerun the app so every tab reflects it."""
+    add_result(result['platform'], result['identifier'], result['url'], result['spin_path'], verification=result)
+    st.session_state.last_conversion = {'platform': result['platform'], 'url': result['url'], 'problem': result['problem']}
+    st.rerun()
+
+def show_last_conversion(platform):
+    """Show the download link for the last conversion if it was for this platform."""
+    last_conversion = st.session_state.get('last_conversion')
+    if last_conversion and last_conversion['platform'] == platform:
+        label = PLATFORMS[platform]['label']
+        if last_conversion.get('problem'):
+            st.warning(f"Converted to {label} format, but the zip failed verification: {last_conversion['problem']}")
+        else:
+            st.success(f"Successfully converted to {label} format!")
+        st.markdown(f"[Download {label} Zip]({last_conversion['url']})")
+
+# Each tab is a fragment: interacting with a widget only reruns its own tab, and the
+# conversion inputs live in forms so typing an identifier doesn't rerun anything.
+@st.fragment
+@profiled_fragment("Conversion tab")
+def conversion_tab():
     # Spin selection section
     st.header("Step 1: Select a Spin")
     spin_selection_method = st.radio(
@@ -752,10 +1483,17 @@ with tab1:
     if spin_selection_method == "Select from account":
         st.session_state.spin_selection_method = "account"
         if client_id and client_secret:
+            with st.spinner("Loading spins from your account..."):
+                adopt_prefetch()
             if get_token():
-                spin_search_query = st.text_input("Search spins", placeholder="Enter spin name or keywords...", key="spin_search_query")
+                search_col, refresh_col = st.columns([4, 1], vertical_alignment="bottom")
+                with search_col:
+                    spin_search_query = st.text_input("Search spins", placeholder="Enter spin name or keywords...", key="spin_search_query")
+                with refresh_col:
+                    if st.button("Refresh spins", help="Reload the spin list from your Sirv account"):
+                        clear_spin_cache()
                 with st.spinner("Loading spins from your account..."):
-                    spins = get_spins(search_query=spin_search_query)
+                    spins = get_cached_spins(search_query=spin_search_query)
                 if spins:
                     st.session_state.selected_spin = st.selectbox(
                         "Select a spin file to convert",
@@ -775,13 +1513,15 @@ with tab1:
             st.info("Please enter your Sirv API credentials in the sidebar to get started.")
     else:
         st.session_state.spin_selection_method = "manual"
-        manual_input = st.text_area(
-            "Enter spin URLs or paths (one per line)",
-            height=150,
-            help="Enter one or more spin URLs or paths, one per line. E.g., /folder/product.spin"
-        )
+        with st.form("manual_spins_form", border=False):
+            manual_input = st.text_area(
+                "Enter spin URLs or paths (one per line)",
+                height=150,
+                help="Enter one or more spin URLs or paths, one per line. E.g., /folder/product.spin"
+            )
+            add_spins = st.form_submit_button("Add Spins")
 
-        if st.button("Add Spins"):
+        if add_spins:
             if manual_input:
                 st.session_state.manual_spin_urls = process_manual_spin_urls(manual_input)
                 if st.session_state.manual_spin_urls:
@@ -811,6 +1551,7 @@ with tab1:
             if st.button("Clear Spin List"):
                 st.session_state.manual_spin_urls = []
                 st.session_state.selected_manual_spin = ""
+                st.rerun(scope="fragment")
 
     # Only show conversion tools if a spin is selected or entered
     spin_selected = (st.session_state.spin_selection_method == "account" and st.session_state.selected_spin) or \
@@ -820,120 +1561,42 @@ with tab1:
         st.header("Step 2: Choose Conversion Format")
         st.markdown("---")
 
-        # MSC Conversion
-        with st.expander("MSC Conversion", expanded=True):
-            st.markdown("Convert a spin to MSC 360° format.")
-            msc_id = st.text_input("MSC ID", key="msc_id")
-
-            if st.button("Convert to MSC Format"):
-                if msc_id:
-                    with st.spinner("Converting to MSC format..."):
-                        result_url = convert_to_msc(get_spin_path(), msc_id)
-                        if result_url:
-                            st.success(f"Successfully converted to MSC format!")
-                            st.markdown(f"[Download MSC Zip]({result_url})")
-                            add_result("MSC", msc_id, result_url)
-                else:
-                    st.warning("Please enter an MSC ID.")
-
-        # Amazon Conversion
-        with st.expander("Amazon Conversion"):
-            st.markdown("Convert a spin to Amazon 360° format.")
-            asin = st.text_input("Amazon ASIN", key="asin",
-                               help="Amazon Standard Identification Number")
-
-            if st.button("Convert to Amazon Format"):
-                if asin:
-                    with st.spinner("Converting to Amazon format..."):
-                        result_url = convert_to_amazon(get_spin_path(), asin)
-                        if result_url:
-                            st.success(f"Successfully converted to Amazon format!")
-                            st.markdown(f"[Download Amazon Zip]({result_url})")
-                            add_result("Amazon", asin, result_url)
-                else:
-                    st.warning("Please enter an Amazon ASIN.")
-
-        # Grainger Conversion
-        with st.expander("Grainger Conversion"):
-            st.markdown("Convert a spin to Grainger 360° format.")
-            sku = st.text_input("Grainger SKU", key="sku")
-
-            if st.button("Convert to Grainger Format"):
-                if sku:
-                    with st.spinner("Converting to Grainger format..."):
-                        result_url = convert_to_grainger(get_spin_path(), sku)
-                        if result_url:
-                            st.success(f"Successfully converted to Grainger format!")
-                            st.markdown(f"[Download Grainger Zip]({result_url})")
-                            add_result("Grainger", sku, result_url)
-                else:
-                    st.warning("Please enter a Grainger SKU.")
-
-        # Walmart Conversion
-        with st.expander("Walmart Conversion"):
-            st.markdown("Convert a spin to Walmart 360° format.")
-            gtin = st.text_input("Walmart GTIN", key="gtin")
-
-            if st.button("Convert to Walmart Format"):
-                if gtin:
-                    with st.spinner("Converting to Walmart format..."):
-                        result_url = convert_to_walmart(get_spin_path(), gtin)
-                        if result_url:
-                            st.success(f"Successfully converted to Walmart format!")
-                            st.markdown(f"[Download Walmart Zip]({result_url})")
-                            add_result("Walmart", gtin, result_url)
-                else:
-                    st.warning("Please enter a Walmart GTIN.")
-
-        # Home Depot Conversion
-        with st.expander("Home Depot Conversion"):
-            st.markdown("Convert a spin to Home Depot 360° format.")
-            omsid = st.text_input("Home Depot OMSID", key="omsid",
-                                help="Home Depot OMSID (9 digits)")
-            spin_number = st.number_input("Spin Number (Optional)",
-                                        key="spin_number",
-                                        min_value=1, step=1,
-                                        help="Only needed if product has multiple spins")
-
-            if st.button("Convert to Home Depot Format"):
-                if omsid:
-                    if len(omsid) == 9:
-                        with st.spinner("Converting to Home Depot format..."):
-                            result_url = convert_to_homedepot(
-                                get_spin_path(),
-                                omsid,
-                                spin_number
-                            )
-                            if result_url:
-                                st.success(f"Successfully converted to Home Depot format!")
-                                st.markdown(f"[Download Home Depot Zip]({result_url})")
-                                add_result("Home Depot", omsid, result_url)
+        for platform, config in PLATFORMS.items():
+            with st.expander(f"{config['label']} Conversion", expanded=platform == "MSC"):
+                st.markdown(f"Convert a spin to {config['label']} 360° format.")
+                with st.form(f"{config['id_field']}_form", border=False):
+                    identifier = st.text_input(config['id_label'], key=config['id_field'], help=config.get('id_help'))
+                    spin_number = None
+                    if config.get('spin_number'):
+                        spin_number = st.number_input("Spin Number (Optional)",
+                                                      key="spin_number",
+                                                      min_value=1, step=1,
+                                                      help="Only needed if product has multiple spins")
+                    submitted = st.form_submit_button(f"Convert to {config['label']} Format")
+
+                if submitted:
+                    problem = identifier_problem(platform, identifier) if identifier else ""
+                    if not identifier:
+                        st.warning(f"Please enter the {config['id_label']}.")
+                    elif problem:
+                        st.warning(f"{problem}.")
                     else:
-                        st.warning("Home Depot OMSID must be 9 digits.")
-                else:
-                    st.warning("Please enter a Home Depot OMSID.")
-
-        # Lowe's Conversion
-        with st.expander("Lowe's Conversion"):
-            st.markdown("Convert a spin to Lowe's 360° format.")
-            barcode = st.text_input("Lowe's Barcode", key="barcode")
-
-            if st.button("Convert to Lowe's Format"):
-                if barcode:
-                    with st.spinner("Converting to Lowe's format..."):
-                        result_url = convert_to_lowes(get_spin_path(), barcode)
-                        if result_url:
-                            st.success(f"Successfully converted to Lowe's format!")
-                            st.markdown(f"[Download Lowe's Zip]({result_url})")
-                            add_result("Lowe's", barcode, result_url)
-                else:
-                    st.warning("Please enter a Lowe's Barcode.")
+                        with st.spinner(f"Converting to {config['label']} format..."):
+                            result = convert_spin(platform, get_spin_path(), identifier, spin_number)
+                        if result['error']:
+                            st.error(f"Error generating {config['label']} zip: {result['error']}")
+                        else:
+                            finish_conversion(result)
+                show_last_conversion(platform)
 
 # Bulk Conversion tab
-with tab2:
+@st.fragment
+@profiled_fragment("Bulk conversion tab")
+def bulk_conversion_tab():
     st.header("Bulk Conversion")
     st.markdown("""
     Convert multiple spins at once. Enter your data in the format: `spin_url,identifier` (one per line).
+    Add a third column to send a row to another platform than the selected one: `spin_url,identifier,platform`.
 
     Examples:
     ```
@@ -945,69 +1608,381 @@ with tab2:
     ```
     @https://sirvreplit.sirv.com/Spins/Trainers/Trainers.spin,887276371399
     ```
+
+    Mixed-platform sheet (rows without a platform use the selected one):
+    ```
+    https://sirvreplit.sirv.com/Spins/Trainers/Trainers.spin,887276371399,Walmart
+    https://sirvreplit.sirv.com/Spins/Trainers/Trainers.spin,B00TRAINER,Amazon
+    ```
     """)
 
-    # Platform selection for bulk conversion
-    bulk_platform = st.selectbox(
-        "Select conversion platform",
-        options=["MSC", "Amazon", "Grainger", "Walmart", "Home Depot", "Lowes"],
-        index=0
-    )
+    with st.form("bulk_conversion_form", border=False):
+        # Platform selection for bulk conversion
+        bulk_platform = st.selectbox(
+            "Select conversion platform",
+            options=list(PLATFORMS),
+            format_func=lambda platform: PLATFORMS[platform]['label'],
+            index=0,
+            help="Used for rows without a platform column"
+        )
 
-    bulk_input = st.text_area(
-        "Enter spin URLs and identifiers (one per line in format: spin_url,identifier)",
-        height=200,
-        help="Enter data in format: spin_url,identifier (one per line)"
-    )
+        bulk_input = st.text_area(
+            "Enter spin URLs and identifiers (one per line in format: spin_url,identifier[,platform])",
+            height=200,
+            help="Enter data in format: spin_url,identifier or spin_url,identifier,platform (one per line)"
+        )
 
-    if st.button("Process Bulk Conversion"):
-        if bulk_input and bulk_platform:
-            # Process the bulk input data
-            bulk_data = process_bulk_conversion_data(bulk_input)
+        run_mode = st.radio(
+            "Run on",
+            options=RUN_MODES,
+            horizontal=True,
+            help=f"Concurrent keeps up to {concurrent_rows()} rows in flight on this server: each row takes "
+                 "a bulk slot of the account, so the account's concurrency limit (SIRV_ACCOUNT_CONCURRENCY "
+                 "or its entry in SIRV_ACCOUNT_CONCURRENCY_OVERRIDES) caps it. "
+                 "Worker queue hands the rows to background worker processes (python worker.py), "
+                 "so large jobs can be spread over several processes or hosts."
+        )
 
-            if bulk_data:
-                st.session_state.bulk_conversion_data = bulk_data
-                st.success(f"Found {len(bulk_data)} items to process")
+        track_for_resync = st.checkbox(
+            "Track these mappings for incremental re-sync",
+            help="Remember each spin/identifier pair so later re-syncs only convert spins modified since"
+        )
+
+        planned_workers = st.number_input(
+            "Workers (Worker queue only)",
+            min_value=1, max_value=64, value=1,
+            help="Number of worker processes you plan to run, used to estimate the job duration"
+        )
+
+        submit_col, estimate_col = st.columns(2)
+        with submit_col:
+            submitted = st.form_submit_button("Process Bulk Conversion")
+        with estimate_col:
+            estimate_requested = st.form_submit_button("Estimate duration and quota")
+
+    if estimate_requested:
+        if bulk_input:
+            bulk_data, skipped = process_bulk_conversion_data(bulk_input, bulk_platform)
+            for message in skipped:
+                st.warning(message)
+            bulk_data, _, _ = dedupe_bulk_data(bulk_data)
+            concurrency = {"This session": 1, "Concurrent": concurrent_rows(), "Worker queue": planned_workers}[run_mode]
+            convert_calls = {}
+            for item in bulk_data:
+                endpoint = f"files/{PLATFORMS[item['platform']]['endpoint']}"
+                convert_calls[endpoint] = convert_calls.get(endpoint, 0) + 1
+            # Output folders are checked once per job, or once per worker on the queue
+            folders = len(output_folders(item['platform'] for item in bulk_data))
+            st.session_state.bulk_estimate = dict(
+                estimate_job(
+                    get_api_stats().latencies(client_id), get_api_stats().rate_limits(client_id), convert_calls,
+                    concurrency=concurrency, folder_checks=folders * (concurrency if run_mode == "Worker queue" else 1)
+                ),
+                platform=job_platform(bulk_data, bulk_platform), rows=len(bulk_data), concurrency=concurrency
+            )
+        else:
+            st.warning("Please enter data to estimate.")
 
-                # Run the bulk conversion
-                with st.spinner(f"Processing {len(bulk_data)} conversions to {bulk_platform} format..."):
-                    results = run_bulk_conversion(bulk_platform, bulk_data)
+    if submitted:
+        if bulk_input and bulk_platform:
+            # Process the bulk input data, collapsing duplicates before any API calls
+            bulk_data, skipped = process_bulk_conversion_data(bulk_input, bulk_platform)
+            bulk_data, duplicates, collisions = dedupe_bulk_data(bulk_data)
 
-                # Show the results
-                st.success(f"Bulk conversion completed: {results['successes']} successful, {results['failures']} failed")
+            # Kept in session state so the report survives the rerun after the run
+            st.session_state.bulk_input_report = {'skipped': skipped, 'duplicates': duplicates, 'collisions': collisions}
+            st.session_state.bulk_results = None
+            st.session_state.bulk_estimate = None
 
-                if results['results']:
-                    st.subheader("Download Links")
-                    for idx, result in enumerate(results['results']):
-                        st.markdown(f"{idx+1}. **{result['identifier']}**: [{result['spin_path']}]({result['url']})")
+            if bulk_data:
+                if track_for_resync:
+                    # Converted from the spins as they are now, see sync_state.py
+                    get_sync_state().track(client_id, bulk_platform, bulk_data)
+                    submitted_mtime = utc_now_mtime()
+                    bulk_data = [dict(item, mtime=submitted_mtime) for item in bulk_data]
+                start_bulk_run(bulk_platform, bulk_data, run_mode)
             else:
                 st.error("No valid data found. Please check your input format.")
         else:
             st.warning("Please enter data and select a platform.")
 
+    estimate = st.session_state.get('bulk_estimate')
+    if estimate:
+        render_estimate(estimate)
+
+    resync_section()
+
+    # Show what the normalization stage collapsed or rejected in the last submitted input
+    report = st.session_state.get('bulk_input_report')
+    if report:
+        for message in report.get('skipped', []):
+            st.warning(message)
+        if report['duplicates']:
+            st.info(f"Collapsed {report['duplicates']} duplicate rows into single conversions.")
+        if report['collisions']:
+            st.error(f"Skipped {len(report['collisions'])} identifiers mapped to more than one spin, "
+                     "their output zips would overwrite each other:")
+            for (platform, identifier), items in report['collisions'].items():
+                st.markdown(f"- **{identifier}** ({PLATFORMS[platform]['label']}): " + ", ".join(
+                    f"{item['spin_path']} (line {', '.join(str(line) for line in item['lines'])})" for item in items
+                ))
+
+    # Show the results of the last bulk run
+    results = st.session_state.get('bulk_results')
+    if results:
+        st.success(f"Bulk conversion completed: {results['successes']} successful, {results['failures']} failed")
+        if results['flagged']:
+            st.warning(f"{results['flagged']} zips still failed verification after being re-queued:")
+            for result in results['flagged_rows']:
+                st.markdown(f"- **{result['identifier']}**: {result['problem']}")
+            if results['flagged'] > len(results['flagged_rows']):
+                st.caption(f"{results['flagged'] - len(results['flagged_rows'])} more are flagged in the manifest.")
+
+        # Converted rows are read back from the run's manifest rather than kept in the session
+        converted = [row for row in run_manifest_rows(results['manifest_dir']) if row['status'] in ('verified', 'flagged')]
+        if converted:
+            st.subheader("Download Links")
+            bundle_download_section(
+                converted,
+                key="bulk"
+            )
+        render_run_rows(results['rows'], results['platform'], results['manifest_dir'], total=results['total_rows'])
+
+    queued_jobs_panel()
+
+# Estimated duration and API usage of a bulk job
+def format_duration(seconds):
+    """Format seconds as e.g. 2 h 05 min, 4 min 10 s or 12 s."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} h {minutes:02d} min"
+    if minutes:
+        return f"{minutes} min {seconds} s"
+    return f"{seconds} s"
+
+def render_estimate(estimate):
+    """Show the predicted wall-clock time, API calls and rate-limit headroom of a bulk job."""
+    runners = "1 conversion at a time" if estimate['concurrency'] == 1 else f"{estimate['concurrency']} rows in flight"
+    st.info(
+        f"**Estimate for {estimate['rows']} {estimate['platform']} rows with {runners}:** "
+        f"about {format_duration(estimate['seconds'])} and {estimate['total_calls']} API calls "
+        f"({', '.join(f'{count} {endpoint}' for endpoint, count in estimate['calls'].items())})."
+    )
+    for bucket in estimate['buckets']:
+        reset = f", resets at {datetime.fromtimestamp(bucket['reset_at']).strftime('%H:%M')}" if bucket['reset_at'] else ""
+        message = (f"Rate limit {bucket['bucket']}: needs {bucket['calls']} calls, "
+                   f"{bucket['remaining']} of {bucket['limit']} remaining{reset}.")
+        if bucket['fits']:
+            st.caption(message)
+        else:
+            st.warning(message + " The job will stall until the limit resets; consider splitting it.")
+    if not estimate['buckets']:
+        st.caption("No rate-limit headers recorded for these endpoints yet.")
+    if estimate['assumed']:
+        st.caption(f"No timings recorded yet for {', '.join(estimate['assumed'])}; typical values were assumed.")
+
+# Jobs whose rows target several platforms are shown as one mixed job
+MIXED_PLATFORM = "Mixed"
+
+def job_platform(bulk_data, platform):
+    """The platform a job is listed under: the rows' common platform, or MIXED_PLATFORM."""
+    platforms = {item.get('platform', platform) for item in bulk_data}
+    return platforms.pop() if len(platforms) == 1 else MIXED_PLATFORM
+
+# Start a bulk run in this session or hand it to the worker queue
+def start_bulk_run(platform, bulk_data, run_mode):
+    """Run bulk rows here (rerunning the app when done) or enqueue them for the workers.
+
+    Rows without their own 'platform' are converted for platform. Rows carrying an
+    'mtime' move their mapping's re-sync watermark once converted.
+    """
+    bulk_data = [dict(item, platform=item.get('platform', platform)) for item in bulk_data]
+    platform = job_platform(bulk_data, platform)
+    if run_mode == "Worker queue":
+        job_id = get_job_queue().enqueue_job(client_id, platform, bulk_data, created_by=get_session_id())
+        st.success(f"Queued job #{job_id} with {len(bulk_data)} rows for the background workers.")
+        return
+
+    st.success(f"Found {len(bulk_data)} items to process")
+
+    # Run the bulk conversion
+    label = PLATFORMS[platform]['label'] if platform in PLATFORMS else "several"
+    with st.spinner(f"Processing {len(bulk_data)} conversions to {label} format..."):
+        results = run_bulk_conversion(platform, bulk_data, ASYNC_CONCURRENCY if run_mode == "Concurrent" else 1)
+
+    mtimes = {(item['platform'], item['spin_path'], item['identifier']): item.get('mtime') for item in bulk_data}
+    for result in results['results']:
+        mtime = mtimes.get((result['platform'], result['spin_path'], result['identifier']))
+        if mtime and result['verified']:
+            get_sync_state().mark_converted(client_id, result['platform'], result['spin_path'],
+                                            result['identifier'], mtime)
+
+    # Keep a bounded summary across the app rerun that refreshes the history tab
+    st.session_state.bulk_results = bulk_results_summary(results)
+    if results['successes']:
+        st.rerun()
+
+# Incremental re-sync of tracked mappings
+RESYNC_MAX_SPINS = 100000
+
+def resync_section():
+    """Find tracked mappings whose spin changed since their last conversion and convert only those."""
+    tracked = get_sync_state().platforms(client_id)
+    with st.expander("Incremental Re-sync", expanded=bool(st.session_state.get('resync_changed'))):
+        if not tracked:
+            st.caption("No tracked mappings yet. Tick \"Track these mappings for incremental re-sync\" "
+                       "when running a bulk sheet to start tracking it.")
+            return
+
+        resync_platform = st.selectbox(
+            "Platform",
+            options=list(tracked),
+            format_func=lambda platform: f"{platform} ({tracked[platform]} tracked mappings)",
+            key="resync_platform"
+        )
+        mappings = get_sync_state().mappings(client_id, resync_platform)
+        watermark = resync_watermark(mappings)
+        if watermark:
+            st.caption(f"Oldest conversion was made from spins as of {watermark}.")
+        else:
+            st.caption("Some mappings were never converted, every tracked spin will be checked.")
+
+        find_col, forget_col = st.columns(2)
+        with find_col:
+            if st.button("Find changed spins", key="resync_find"):
+                if get_token():
+                    with st.spinner("Searching for spins modified since the last conversion..."):
+                        spin_mtimes = dict(get_spins(modified_since=watermark, with_mtime=True, max_results=RESYNC_MAX_SPINS))
+                    st.session_state.resync_changed = {
+                        'platform': resync_platform,
+                        'rows': find_changed_mappings(mappings, spin_mtimes)
+                    }
+        with forget_col:
+            if st.button("Stop tracking this platform", key="resync_forget"):
+                get_sync_state().forget(client_id, resync_platform)
+                st.session_state.resync_changed = None
+                st.rerun(scope="fragment")
+
+        changed = st.session_state.get('resync_changed')
+        if not changed or changed['platform'] != resync_platform:
+            return
+        if not changed['rows']:
+            st.success("All tracked spins are up to date.")
+            return
+
+        st.write(f"{len(changed['rows'])} of {len(mappings)} tracked spins changed since their last conversion.")
+        st.dataframe(
+            [{'spin': row['spin_path'], 'identifier': row['identifier'], 'modified': row['mtime'],
+              'last converted from': row['last_converted_mtime'] or "never"} for row in changed['rows']],
+            hide_index=True, use_container_width=True
+        )
+        resync_mode = st.radio("Run on", options=RUN_MODES, horizontal=True, key="resync_run_mode")
+        if st.button(f"Convert {len(changed['rows'])} changed spins", key="resync_convert"):
+            rows = [{'spin_path': row['spin_path'], 'identifier': row['identifier'], 'mtime': row['mtime']}
+                    for row in changed['rows']]
+            st.session_state.resync_changed = None
+            start_bulk_run(resync_platform, rows, resync_mode)
+
+# Progress of jobs handed to the worker queue, refreshed every few seconds
+@st.fragment(run_every=5)
+@profiled_fragment("Worker queue panel")
+def queued_jobs_panel():
+    jobs = get_job_queue().list_jobs(client_id)
+    if not jobs:
+        return
+
+    st.subheader("Worker Queue Jobs")
+    imported_jobs = st.session_state.setdefault('imported_jobs', set())
+    for job in jobs:
+        counts = job['counts']
+        processed = counts['done'] + counts['failed'] + counts['cancelled']
+        created = datetime.fromtimestamp(job['created_at']).strftime("%Y-%m-%d %H:%M:%S")
+        with st.expander(f"Job #{job['id']} · {job['platform']} · {processed}/{job['total']} · {created}",
+                         expanded=not job['finished']):
+            st.progress(processed / job['total'] if job['total'] else 1.0)
+            st.write(f"**Done:** {counts['done']} · **Failed:** {counts['failed']} · "
+                     f"**In progress:** {counts['leased']} · **Queued:** {counts['queued']}"
+                     + (f" · **Cancelled:** {counts['cancelled']}" if counts['cancelled'] else ""))
+            if counts['stalled']:
+                st.warning(f"{counts['stalled']} rows are held by workers that stopped responding, "
+                           "they will be picked up again when their lease runs out.")
+            if counts['queued'] and not counts['leased']:
+                st.caption("Waiting for a worker. Start one with `python worker.py`.")
+
+            if not job['finished']:
+                if st.button("Cancel queued rows", key=f"cancel_job_{job['id']}"):
+                    get_job_queue().cancel_job(job['id'])
+                    st.rerun(scope="fragment")
+                continue
+
+            rows = get_job_queue().job_rows(job['id'])
+            failed = [row for row in rows if row['status'] == 'failed']
+            for row in failed:
+                st.markdown(f"- **{row['identifier']}** ({row['spin_path']}): {row['error']}")
+
+            done = [{'platform': row['platform'], 'identifier': row['identifier'],
+                     'spin_path': row['spin_path'], 'url': row['result_url'],
+                     'content_length': row['content_length']} for row in rows if row['status'] == 'done']
+            if done:
+                bundle_download_section(done, key=f"job_{job['id']}")
+                if job['id'] not in imported_jobs and st.button("Add results to history", key=f"import_job_{job['id']}"):
+                    for item in done:
+                        add_result(item['platform'], item['identifier'], item['url'], item['spin_path'],
+                                   verification={'http_status': 200, 'content_length': item['content_length'], 'verified': True, 'problem': ''})
+                    imported_jobs.add(job['id'])
+                    st.rerun()
+
+# Entries spilled out of session memory, read back a page at a time
+ARCHIVE_PAGE_SIZE = 50
+
+def archived_history_section(history):
+    """Page through history entries that no longer fit in memory."""
+    if not history.spilled and not history.pending_spill:
+        return
+    archived = history.total() - len(history)
+    with st.expander(f"Older conversions ({archived} archived)"):
+        pages = (archived + ARCHIVE_PAGE_SIZE - 1) // ARCHIVE_PAGE_SIZE
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="archive_page")
+        st.dataframe(
+            [record.to_dict() for record in history.older((page - 1) * ARCHIVE_PAGE_SIZE, ARCHIVE_PAGE_SIZE)],
+            column_order=['timestamp', 'platform', 'identifier', 'url', 'spin_path', 'content_length', 'problem'],
+            column_config={'url': st.column_config.LinkColumn("URL")},
+            hide_index=True, use_container_width=True
+        )
+
 # Conversion History tab
-with tab3:
+@st.fragment
+@profiled_fragment("History tab")
+def history_tab():
     st.header("Conversion History")
 
     # Add information about localStorage persistence
     st.info("Conversion history is saved in your browser and will persist between sessions.")
 
-    if not st.session_state.conversion_results:
+    with st.spinner("Loading conversion history..."):
+        history = get_history()
+    if not history.total():
         st.info("No conversions have been performed yet.")
     else:
         # Create a dataframe for the conversion history
-        st.write(f"Total conversions: {len(st.session_state.conversion_results)}")
+        st.write(f"Total conversions: {history.total()}")
+        bundle_download_section(list(history), key="history")
+        redownload_section(list(history))
+        archived_history_section(history)
 
         # Display the conversion history as a table with thumbnails
-        for result in st.session_state.conversion_results:
+        for result in history:
             col1, col2, col3, col4 = st.columns([1, 1, 1.5, 0.5])
 
+            # Thumbnail URLs are built from the cached account URL, no API call per row
+            thumbnail_url = get_thumbnail_url(result['spin_path']) if 'spin_path' in result else None
+
             # Display thumbnail in the first column
             with col1:
-                if 'spin_path' in result:
-                    thumbnail_url = get_thumbnail_url(result['spin_path'])
-                    if thumbnail_url:
-                        st.image(thumbnail_url, width=100)
+                if thumbnail_url:
+                    st.image(thumbnail_url, width=100)
 
             with col2:
                 st.write(f"**Platform:** {result['platform']}")
@@ -1018,21 +1993,78 @@ with tab3:
             with col3:
                 st.write(f"**Time:** {result['timestamp']}")
                 st.write(f"**Download:** [Link]({result['url']})")
+                if result.get('verified') is False:
+                    st.write(f"⚠️ **Verification failed:** {result['problem']}")
+                elif result.get('content_length'):
+                    st.write(f"**Size:** {result['content_length'] / 1024:.0f} KB")
 
             with col4:
                 # Add a button to view the full spin
-                if 'spin_path' in result:
-                    spin_path = result['spin_path']
-                    thumbnail_url = get_thumbnail_url(spin_path)
-                    if thumbnail_url:
-                        spin_url = thumbnail_url.replace('?thumb', '')
-                        st.markdown(f"[View Spin]({spin_url})")
+                if thumbnail_url:
+                    spin_url = thumbnail_url.replace('?thumb', '')
+                    st.markdown(f"[View Spin]({spin_url})")
 
             st.divider()
 
         if st.button("Clear History"):
-            st.session_state.conversion_results = []
+            history.clear()
             # Also clear the history in localStorage
-            localStorage.setItem("conversion_history", "[]", key="clear_history")
+            st.session_state.history_dirty = True
+            st.rerun()
 
+# Main app interface
+save_history_to_local_storage()
+if st.session_state.spin_selection_method == "account":
+    start_prefetch()
+
+# Only the selected view runs (st.tabs would run all three on every rerun),
+# so the history isn't loaded until its view is opened
+VIEWS = ["Conversion Tools", "Bulk Conversion", "Conversion History"]
+view = st.radio("View", VIEWS, key="view", horizontal=True, label_visibility="collapsed")
+
+if view == "Conversion Tools":
+    conversion_tab()
+elif view == "Bulk Conversion":
+    bulk_conversion_tab()
+else:
+    history_tab()
+
+# State of the circuit breakers of this account's Sirv endpoints
+def render_breaker_panel():
+    """List the endpoints whose circuit breaker is open or half-open."""
+    tripped = {endpoint: breaker for endpoint, breaker in get_breakers().snapshot(client_id).items()
+               if breaker['state'] != 'closed'}
+    if not tripped:
+        return
+    with st.sidebar.expander("Sirv endpoint health", expanded=True):
+        st.warning("Calls to these endpoints are paused after repeated failures:")
+        st.dataframe(
+            [{'endpoint': endpoint, 'state': breaker['state'], 'failures': breaker['failures'],
+              'next probe': format_duration(breaker['retry_in']) if breaker['retry_in'] else "now"}
+             for endpoint, breaker in tripped.items()],
+            hide_index=True, use_container_width=True
+        )
+
+render_breaker_panel()
+
+# Server-wide conversion queue
+with st.sidebar.expander("Conversion queue"):
+    queue = get_scheduler().snapshot()
+    st.caption(f"Up to {MAX_CONCURRENT_CONVERSIONS} conversions run at once on this server, "
+               f"{ACCOUNT_CONCURRENCY} per account unless configured otherwise.")
+    if queue:
+        st.dataframe(
+            [{'account': ("you" if account == client_id else f"{account[:4]}…"),
+              'running': entry['running'], 'limit': entry['limit'],
+              'queued (single)': entry['queued_interactive'], 'queued (bulk)': entry['queued_bulk']}
+             for account, entry in queue.items()],
+            hide_index=True, use_container_width=True
+        )
+    else:
+        st.write("No conversions running.")
 
+# Rerun profiling toggle and breakdown panel
+st.sidebar.toggle("Profile reruns", key="profile_reruns",
+                  help="Time each section and API helper on every rerun")
+if profiling_enabled:
+    render_profile_panel()
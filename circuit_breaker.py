@@ -0,0 +1,141 @@
+"""Circuit breakers per Sirv account and API endpoint.
+
+A breaker opens after BREAKER_FAILURES consecutive failures (5xx, 429 or no answer)
+and rejects calls to its endpoint until a cooldown has passed. Then it is half-open:
+a single probe call is let through, closing the breaker if it succeeds and reopening
+it with a doubled cooldown if it fails.
+"""
+import os
+import time
+import threading
+
+BREAKER_FAILURES = int(os.getenv("SIRV_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("SIRV_BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = 300.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit open for {endpoint}, Sirv keeps failing; next probe in {retry_in:.0f} s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+def is_failure(status_code):
+    """Whether an answer counts against the endpoint's health (client errors don't)."""
+    return status_code is None or status_code >= 500 or status_code == 429
+
+class CircuitBreaker:
+    """State of one endpoint. Not thread-safe on its own, BreakerBoard holds the lock."""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.retry_at = 0.0
+        self.probing = False
+
+    def allow(self, now):
+        """Whether a call may go out now; the first one after the cooldown is the probe."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.retry_at:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def succeeded(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probing = False
+
+    def failed(self, now):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+        elif self.failures < BREAKER_FAILURES:
+            return
+        self.state = OPEN
+        self.retry_at = now + self.cooldown
+        self.probing = False
+
+class BreakerBoard:
+    """Breakers of every account and endpoint seen by this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def _breaker(self, account, endpoint):
+        return self.breakers.setdefault((account, endpoint), CircuitBreaker())
+
+    def before_call(self, account, endpoint):
+        """Raise CircuitOpen unless a call to the endpoint may go out now."""
+        now = time.time()
+        with self.lock:
+            breaker = self._breaker(account, endpoint)
+            if not breaker.allow(now):
+                raise CircuitOpen(endpoint, max(0.0, breaker.retry_at - now))
+
+    def after_call(self, account, endpoint, status_code):
+        """Record the outcome of a call; status_code is None when there was no answer."""
+        with self.lock:
+            breaker = self._breaker(account, endpoint)
+            if is_failure(status_code):
+                breaker.failed(time.time())
+            else:
+                breaker.succeeded()
+
+    def _breakers_of(self, account, endpoints=None):
+        """Breakers of an account, only those of the given endpoints if any. Call with the lock held."""
+        return [breaker for (breaker_account, endpoint), breaker in self.breakers.items()
+                if breaker_account == account and (endpoints is None or endpoint in endpoints)]
+
+    def state(self, account, endpoint):
+        """CLOSED, OPEN or HALF_OPEN for one endpoint of an account."""
+        with self.lock:
+            breaker = self.breakers.get((account, endpoint))
+            return breaker.state if breaker else CLOSED
+
+    def seconds_until_probe(self, account, endpoints=None):
+        """Seconds until every open breaker of an account (or of some of its endpoints) lets a probe through."""
+        now = time.time()
+        with self.lock:
+            waits = [breaker.retry_at - now for breaker in self._breakers_of(account, endpoints)
+                     if breaker.state == OPEN]
+        return max([0.0] + waits)
+
+    def tripped(self, account, endpoints=None):
+        """Whether any breaker of an account (or of some of its endpoints) is open or half-open."""
+        with self.lock:
+            return any(breaker.state != CLOSED for breaker in self._breakers_of(account, endpoints))
+
+    def is_outage(self, account, error):
+        """Whether an error means Sirv is down for the call rather than the call (or row) being bad.
+
+        That is CircuitOpen, or a failure (see is_failure) on an endpoint whose breaker
+        has tripped. Other errors carry the endpoint and status_code of the failed call,
+        see sirv_api.SirvError; errors without an endpoint never count.
+        """
+        if isinstance(error, CircuitOpen):
+            return True
+        endpoint = getattr(error, 'endpoint', None)
+        if endpoint is None or not is_failure(getattr(error, 'status_code', None)):
+            return False
+        return self.state(account, endpoint) != CLOSED
+
+    def snapshot(self, account):
+        """{endpoint: {'state', 'failures', 'retry_in'}} for the breakers of an account."""
+        now = time.time()
+        with self.lock:
+            return {endpoint: {'state': breaker.state, 'failures': breaker.failures,
+                               'retry_in': max(0.0, breaker.retry_at - now) if breaker.state == OPEN else 0.0}
+                    for (breaker_account, endpoint), breaker in self.breakers.items()
+                    if breaker_account == account}
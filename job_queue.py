@@ -0,0 +1,211 @@
+"""Durable SQLite-backed queue of bulk conversion rows shared by the app and worker processes.
+
+The app enqueues jobs; any number of `worker.py` processes, on this or other hosts
+that can open the same database file, claim rows under a lease. A row whose lease
+runs out (worker crashed or hung) becomes claimable again, up to MAX_ATTEMPTS.
+"""
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = os.getenv(
+    "SIRV_QUEUE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sirv_jobs.db")
+)
+# WAL lets the UI read progress while workers write, but needs all processes on one host;
+# use DELETE when the database sits on a shared network filesystem
+JOURNAL_MODE = os.getenv("SIRV_QUEUE_JOURNAL_MODE", "WAL")
+DEFAULT_LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    created_by TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    platform TEXT NOT NULL,
+    spin_path TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result_url TEXT,
+    content_length INTEGER,
+    error TEXT,
+    source_mtime TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS job_rows_status ON job_rows(status, id);
+CREATE INDEX IF NOT EXISTS job_rows_job ON job_rows(job_id, status);
+"""
+
+ROW_STATUSES = ('queued', 'leased', 'done', 'failed', 'cancelled')
+
+class JobQueue:
+    """Queue of conversion rows stored in a SQLite database file."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+            conn.executescript(SCHEMA)
+            # Databases created before incremental re-sync lack the source spin mtime
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(job_rows)")]
+            if 'source_mtime' not in columns:
+                conn.execute("ALTER TABLE job_rows ADD COLUMN source_mtime TEXT")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue_job(self, account, platform, rows, created_by=None):
+        """Add a job with rows of {'spin_path', 'identifier'} and return its id.
+
+        A row's optional 'mtime' is the spin modification time it is converted from,
+        recorded for incremental re-sync once the row is done.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            job_id = conn.execute(
+                "INSERT INTO jobs (account, platform, created_by, created_at) VALUES (?, ?, ?, ?)",
+                (account, platform, created_by, now)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO job_rows (job_id, platform, spin_path, identifier, source_mtime, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, row.get('platform', platform), row['spin_path'], row['identifier'], row.get('mtime'), now)
+                 for row in rows]
+            )
+        return job_id
+
+    def claim(self, worker_id, account, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease the next row for an account to a worker, or return None if there is none."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Rows whose lease ran out too often keep crashing their worker, stop retrying them
+            conn.execute(
+                "UPDATE job_rows SET status = 'failed', lease_owner = NULL, updated_at = ?, "
+                "error = 'Lease expired ' || attempts || ' times without the row finishing' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, MAX_ATTEMPTS)
+            )
+            row = conn.execute(
+                "SELECT job_rows.* FROM job_rows JOIN jobs ON jobs.id = job_rows.job_id "
+                "WHERE jobs.account = ? AND (job_rows.status = 'queued' "
+                "OR (job_rows.status = 'leased' AND job_rows.lease_expires < ?)) "
+                "ORDER BY job_rows.id LIMIT 1",
+                (account, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE job_rows SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row['id'])
+            )
+        claimed = dict(row)
+        claimed['attempts'] += 1
+        return claimed
+
+    def heartbeat(self, row_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease; returns False if the worker no longer holds it."""
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE job_rows SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (now + lease_seconds, now, row_id, worker_id)
+            ).rowcount
+        return updated == 1
+
+    def complete(self, row_id, worker_id, result_url, content_length=None):
+        """Mark a leased row done; returns False if the lease was lost in the meantime."""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE job_rows SET status = 'done', result_url = ?, content_length = ?, error = NULL, "
+                "lease_owner = NULL, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (result_url, content_length, time.time(), row_id, worker_id)
+            ).rowcount
+        return updated == 1
+
+    def fail(self, row_id, worker_id, error, retry=True):
+        """Record a failed attempt, putting the row back in the queue if it may be retried."""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE job_rows SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "error = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (retry, MAX_ATTEMPTS, error, time.time(), row_id, worker_id)
+            ).rowcount
+        return updated == 1
+
+    def defer(self, row_id, worker_id):
+        """Put a leased row back in the queue without counting the attempt, e.g. while Sirv is down."""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE job_rows SET status = 'queued', attempts = attempts - 1, lease_owner = NULL, "
+                "updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time(), row_id, worker_id)
+            ).rowcount
+        return updated == 1
+
+    def cancel_job(self, job_id):
+        """Cancel the rows of a job that no worker has claimed yet."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE job_rows SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+
+    def list_jobs(self, account, limit=20):
+        """Most recent jobs of an account with row counts per status."""
+        now = time.time()
+        with self._connect() as conn:
+            jobs = [dict(job) for job in conn.execute(
+                "SELECT * FROM jobs WHERE account = ? ORDER BY id DESC LIMIT ?", (account, limit)
+            )]
+            for job in jobs:
+                counts = dict.fromkeys(ROW_STATUSES, 0)
+                counts['stalled'] = 0
+                for row in conn.execute(
+                    "SELECT status, lease_expires < ? AS expired, COUNT(*) AS count FROM job_rows "
+                    "WHERE job_id = ? GROUP BY status, expired", (now, job['id'])
+                ):
+                    counts[row['status']] += row['count']
+                    if row['status'] == 'leased' and row['expired']:
+                        counts['stalled'] += row['count']
+                job['counts'] = counts
+                job['total'] = sum(counts[status] for status in ROW_STATUSES)
+                job['finished'] = counts['queued'] == 0 and counts['leased'] == 0
+        return jobs
+
+    def job_rows(self, job_id):
+        """All rows of a job in the order they were queued."""
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT * FROM job_rows WHERE job_id = ? ORDER BY id", (job_id,)
+            )]
@@ -0,0 +1,181 @@
+"""Bounded per-session conversion history.
+
+Each session keeps its most recent conversions in memory as compact slot-based
+records; older ones spill to the job queue database under a per-browser history
+key, so long-lived sessions on a shared server stop growing after big bulk runs.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+from collections import deque
+from contextlib import contextmanager
+from job_queue import DEFAULT_DB_PATH
+
+HISTORY_MEMORY_SIZE = int(os.getenv("SIRV_HISTORY_MEMORY_SIZE", "200"))
+# Spilled records are written in batches rather than one transaction per conversion
+SPILL_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_spill (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    history_key TEXT NOT NULL,
+    record TEXT NOT NULL,
+    spilled_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_spill_key ON history_spill(history_key, id);
+"""
+
+def split_path(path):
+    """Split a path or URL into its interned folder (with the trailing slash) and the name after it."""
+    cut = path.rfind('/') + 1
+    return sys.intern(path[:cut]), path[cut:]
+
+class HistoryRecord:
+    """One conversion in the history; reads like the dicts it replaces (record['url'], record.get(...))."""
+
+    __slots__ = ('timestamp', 'platform', 'identifier', 'url_folder', 'url_name', 'spin_folder', 'spin_name',
+                 'http_status', 'content_length', 'verified', 'problem')
+    FIELDS = ('timestamp', 'platform', 'identifier', 'url', 'spin_path',
+              'http_status', 'content_length', 'verified', 'problem')
+
+    def __init__(self, timestamp, platform, identifier, url, spin_path=None,
+                 http_status=None, content_length=None, verified=None, problem=None):
+        self.timestamp = timestamp
+        # The same few platforms and output/spin folders repeat across thousands of records
+        self.platform = sys.intern(platform)
+        self.identifier = identifier
+        self.url_folder, self.url_name = split_path(url or '')
+        self.spin_folder, self.spin_name = split_path(spin_path) if spin_path else (None, None)
+        self.http_status = http_status
+        self.content_length = content_length
+        self.verified = verified
+        self.problem = problem
+
+    @property
+    def url(self):
+        return self.url_folder + self.url_name
+
+    @property
+    def spin_path(self):
+        return self.spin_folder + self.spin_name if self.spin_name is not None else None
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS or (field == 'spin_path' and self.spin_name is None):
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in self.FIELDS and self.get(field) is not None
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in self.FIELDS else None
+        return default if value is None else value
+
+    def to_dict(self):
+        """The record as the dict stored in browser localStorage, without empty fields."""
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+class SessionHistory:
+    """Newest-first history holding at most `capacity` records in memory."""
+
+    def __init__(self, history_key, records=(), capacity=HISTORY_MEMORY_SIZE, path=DEFAULT_DB_PATH):
+        self.history_key = history_key
+        self.path = path
+        self.recent = deque(maxlen=capacity)
+        self.pending_spill = []
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self.spilled = conn.execute(
+                "SELECT COUNT(*) FROM history_spill WHERE history_key = ?", (history_key,)
+            ).fetchone()[0]
+        # records are newest first, keep the newest in memory
+        for record in reversed(list(records)):
+            self._push(record)
+        self.flush()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _push(self, record):
+        if len(self.recent) == self.recent.maxlen:
+            self.pending_spill.append(self.recent.pop())
+        self.recent.appendleft(record)
+
+    def add(self, record):
+        """Add the newest record, spilling the oldest in-memory one when full."""
+        self._push(record)
+        if len(self.pending_spill) >= SPILL_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write spilled records to the database."""
+        if not self.pending_spill:
+            return
+        now = time.time()
+        # Records spill oldest first, so row ids follow conversion order
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO history_spill (history_key, record, spilled_at) VALUES (?, ?, ?)",
+                [(self.history_key, json.dumps(record.to_dict()), now) for record in self.pending_spill]
+            )
+        self.spilled += len(self.pending_spill)
+        self.pending_spill = []
+
+    def older(self, offset=0, limit=50):
+        """A page of spilled records, newest first."""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT record FROM history_spill WHERE history_key = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (self.history_key, limit, offset)
+            ).fetchall()
+        return [HistoryRecord.from_dict(json.loads(row[0])) for row in rows]
+
+    def total(self):
+        """Number of records in memory and spilled."""
+        return len(self.recent) + len(self.pending_spill) + self.spilled
+
+    def clear(self):
+        self.recent.clear()
+        self.pending_spill = []
+        self.spilled = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM history_spill WHERE history_key = ?", (self.history_key,))
+
+    def __iter__(self):
+        return iter(self.recent)
+
+    def __len__(self):
+        return len(self.recent)
+
+def deep_sizeof(value, seen=None):
+    """Approximate bytes held by a value and everything it references."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        pass
+    else:
+        for slot in getattr(type(value), '__slots__', ()):
+            size += deep_sizeof(getattr(value, slot, None), seen)
+        if hasattr(value, '__dict__'):
+            size += deep_sizeof(vars(value), seen)
+    return size
@@ -0,0 +1,126 @@
+"""Sirv platform registry and the conversion rules shared by the app, sirv_async.py and worker.py."""
+import os
+import re
+
+API_URL = 'https://api.sirv.com/v2'
+TOKEN_EXPIRY = 4.5 * 60  # 4.5 minutes in seconds (token expires after 5 minutes)
+MIN_ZIP_BYTES = int(os.getenv("SIRV_MIN_ZIP_BYTES", "1024"))  # smaller zips are flagged as suspicious
+VERIFY_RETRIES = 2  # times a broken zip is re-converted before it is left flagged
+VERIFY_RETRY_DELAY = 2  # seconds to let the CDN pick up re-converted zips
+
+# Platform registry: every conversion path (single, bulk, concurrent, workers) is driven by it
+# through the one engine, sirv_async.AsyncSirvClient.convert_and_verify.
+# endpoint/id_field build the API call, folder is where the zip is moved to, id_pattern (if set)
+# is the rule an identifier must match, label/id_label are what the UI shows, and
+# spin_number marks endpoints that accept a spinNumber for products with several spins.
+PLATFORMS = {
+    "MSC": {'endpoint': 'spin2msc360', 'id_field': 'mscid', 'folder': '/Zips-MSC/',
+            'label': "MSC", 'id_label': "MSC ID"},
+    "Amazon": {'endpoint': 'spin2amazon360', 'id_field': 'asin', 'folder': '/Zips-Amazon/',
+               'label': "Amazon", 'id_label': "Amazon ASIN", 'id_help': "Amazon Standard Identification Number"},
+    "Grainger": {'endpoint': 'spin2grainger360', 'id_field': 'sku', 'folder': '/Zips-Grainger/',
+                 'label': "Grainger", 'id_label': "Grainger SKU"},
+    "Walmart": {'endpoint': 'spin2walmart360', 'id_field': 'gtin', 'folder': '/Zips-Walmart/',
+                'label': "Walmart", 'id_label': "Walmart GTIN"},
+    "Home Depot": {'endpoint': 'spin2homedepot360', 'id_field': 'omsid', 'folder': '/Zips-HomeDepot/',
+                   'label': "Home Depot", 'id_label': "Home Depot OMSID", 'id_help': "Home Depot OMSID (9 digits)",
+                   'id_pattern': r'\d{9}', 'id_rule': "must be 9 digits", 'spin_number': True},
+    "Lowes": {'endpoint': 'spin2lowes360', 'id_field': 'barcode', 'folder': '/Zips-Lowes/',
+              'label': "Lowe's", 'id_label': "Lowe's Barcode"},
+}
+
+class SirvError(Exception):
+    """Raised when the Sirv API answers with an error, or doesn't answer (status_code None).
+
+    endpoint is the breaker key of the failed call (e.g. 'files/rename'), None for
+    errors raised before any call.
+    """
+
+    def __init__(self, message, endpoint=None, status_code=None):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.status_code = status_code
+
+class InvalidIdentifier(SirvError):
+    """Raised for identifiers a platform will never accept, so retrying is pointless."""
+
+def format_account_url(url):
+    """Make sure an account URL starts with https://."""
+    url = url.strip()
+    if not url:
+        return ""
+    if url.startswith("https://"):
+        return url
+    return "https://" + url
+
+def spin_search_query(search_query='', modified_since=None):
+    """files/search query for spins outside the trash, optionally modified after an ISO 8601 time."""
+    # Construct the base search query to exclude trash
+    base_query = '-dirname:\\/.Trash'
+    if search_query:
+        query = f'{search_query} AND extension:.spin AND {base_query}'
+    else:
+        query = f'extension:.spin AND {base_query}'
+    # Only spins modified after the given time (colons must be escaped in the query)
+    if modified_since:
+        escaped_since = modified_since.replace(':', '\\:')
+        query = f'{query} AND mtime:>{escaped_since}'
+    return query
+
+def zip_problem(http_status, content_length):
+    """What is wrong with a generated zip given its HEAD answer, or '' if it looks fine."""
+    if http_status != 200:
+        return f"HTTP {http_status}"
+    if content_length == 0:
+        return "empty zip"
+    if content_length is not None and content_length < MIN_ZIP_BYTES:
+        return f"suspiciously small zip ({content_length} bytes)"
+    return ""
+
+def find_platform(name):
+    """The PLATFORMS key for a platform named in a sheet ("lowes", "Lowe's", "home depot"...), or None."""
+    wanted = re.sub(r'[^a-z0-9]', '', name.lower())
+    for platform, config in PLATFORMS.items():
+        if wanted in (re.sub(r'[^a-z0-9]', '', platform.lower()), re.sub(r'[^a-z0-9]', '', config['label'].lower())):
+            return platform
+    return None
+
+def identifier_problem(platform, identifier):
+    """Why a platform would reject an identifier, or '' if it passes the platform's rule."""
+    config = PLATFORMS[platform]
+    if config.get('id_pattern') and not re.fullmatch(config['id_pattern'], identifier):
+        return f"{config['id_label']} {identifier} {config['id_rule']}"
+    return ""
+
+def conversion_request(platform, spin_path, identifier, spin_number=None):
+    """(endpoint path, JSON payload) of a platform's conversion call."""
+    config = PLATFORMS[platform]
+    payload = {'filename': spin_path, config['id_field']: identifier}
+    if spin_number and config.get('spin_number'):
+        payload['spinNumber'] = int(spin_number)
+    return f"/files/{config['endpoint']}", payload
+
+def output_path(platform, identifier):
+    """Where a platform's zip for an identifier is moved to."""
+    return f"{PLATFORMS[platform]['folder']}{identifier}.zip"
+
+def conversion_endpoints(platform):
+    """API endpoints (circuit breaker keys) a platform's conversion calls on its way."""
+    return ['token', 'account', 'files/readdir', 'files/mkdir', f"files/{PLATFORMS[platform]['endpoint']}",
+            'files/rename']
+
+def output_folders(platforms):
+    """Distinct output folders of some platforms, in first-seen order."""
+    return list(dict.fromkeys(PLATFORMS[platform]['folder'] for platform in platforms))
+
+def zip_check(http_status=None, content_length=None, error=None):
+    """Describe a generated zip from its HEAD answer, or from the error that prevented one."""
+    check = {'http_status': http_status, 'content_length': None, 'verified': False, 'problem': ''}
+    if error is not None:
+        check['problem'] = f"unreachable: {str(error)}"
+        return check
+    if content_length is not None and content_length.isdigit():
+        check['content_length'] = int(content_length)
+    check['problem'] = zip_problem(http_status, check['content_length'])
+    check['verified'] = not check['problem']
+    return check
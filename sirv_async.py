@@ -0,0 +1,352 @@
+"""asyncio Sirv API client, the conversion engine of the app and the background workers.
+
+AsyncSirvClient covers the endpoints a bulk job needs (token, search/scroll,
+readdir/mkdir, rename and the spin2*360 conversions) over one pooled aiohttp
+session, with at most `concurrency` API calls in flight; convert_and_verify()
+handles one row and run_bulk() a whole job, taking a slot per row from the caller.
+SyncSirvFacade runs the client on a background event loop and wraps it in blocking
+calls for the synchronous Streamlit code and worker.py.
+"""
+import os
+import json
+import copy
+import time
+import asyncio
+import threading
+import contextvars
+import aiohttp
+from circuit_breaker import is_failure
+from sirv_api import (
+    API_URL, TOKEN_EXPIRY, PLATFORMS, VERIFY_RETRIES, VERIFY_RETRY_DELAY, SirvError, InvalidIdentifier,
+    format_account_url, spin_search_query, zip_check, identifier_problem, conversion_request, output_path,
+    conversion_endpoints, output_folders
+)
+
+ASYNC_CONCURRENCY = int(os.getenv("SIRV_ASYNC_CONCURRENCY", "32"))
+# Connections kept open to api.sirv.com and the CDN together
+POOL_SIZE = int(os.getenv("SIRV_ASYNC_POOL_SIZE", "64"))
+
+# Called with the endpoint of every API call made on behalf of a SyncSirvFacade.observed caller
+call_observer = contextvars.ContextVar('call_observer', default=None)
+
+class AsyncSirvClient:
+    """Sirv API client for one account on a shared aiohttp connection pool.
+
+    Must be used from a single event loop. stats (api_stats.ApiStats), recording call
+    durations and rate limits, and breakers (circuit_breaker.BreakerBoard), under which
+    calls to an endpoint held open raise CircuitOpen, are optional.
+    """
+
+    def __init__(self, client_id, client_secret, concurrency=ASYNC_CONCURRENCY, stats=None, breakers=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.concurrency = concurrency
+        self.stats = stats
+        self.breakers = breakers
+        self.token = ""
+        self.token_timestamp = 0
+        self._account_url = ""
+        self.known_folders = set()
+        self._session = None
+        self._token_lock = None
+        self._account_lock = None
+        self._folder_locks = {}
+        # Bounds the API calls in flight across every job run on this client
+        self._api_slots = None
+
+    def _ensure_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=POOL_SIZE, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120))
+            self._token_lock = asyncio.Lock()
+            self._account_lock = asyncio.Lock()
+            self._folder_locks = {}
+            self._api_slots = asyncio.BoundedSemaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _send(self, method, path, headers, **kwargs):
+        """Send one API call within the concurrency bound, recording its outcome.
+
+        Returns the body of a 200 answer and raises SirvError (with the call's endpoint
+        and status code) for any other answer or none at all.
+        """
+        session = self._ensure_session()
+        endpoint = path.split('?', 1)[0].strip('/')
+        if self.breakers:
+            self.breakers.before_call(self.client_id, endpoint)
+        observer = call_observer.get()
+        if observer:
+            observer(endpoint)
+        status_code = None
+        start = time.perf_counter()
+        try:
+            async with self._api_slots:
+                async with session.request(method, f'{API_URL}{path}', headers=headers, **kwargs) as response:
+                    status_code = response.status
+                    body = await response.read()
+                    response_headers = dict(response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise SirvError(f"{method} {path}: no answer ({str(e) or type(e).__name__})", endpoint) from e
+        finally:
+            if self.breakers:
+                self.breakers.after_call(self.client_id, endpoint, status_code)
+        if self.stats:
+            self.stats.record(self.client_id, f'{API_URL}{path}', time.perf_counter() - start, response_headers)
+        if status_code != 200:
+            raise SirvError(f"{method} {path}: {status_code} - {body.decode(errors='replace')}", endpoint, status_code)
+        return body
+
+    async def get_token(self):
+        """Get a fresh token if the current one is expired or doesn't exist."""
+        self._ensure_session()
+        async with self._token_lock:
+            current_time = time.time()
+            if not self.token or current_time - self.token_timestamp > TOKEN_EXPIRY:
+                payload = {'clientId': self.client_id, 'clientSecret': self.client_secret}
+                body = await self._send('POST', '/token', {'content-type': 'application/json'},
+                                        data=json.dumps(payload))
+                self.token = json.loads(body)['token']
+                self.token_timestamp = current_time
+        return self.token
+
+    async def request(self, method, path, **kwargs):
+        """Call an API endpoint and return its JSON answer, raising SirvError for anything but 200."""
+        headers = {
+            'content-type': 'application/json',
+            'authorization': f'Bearer {await self.get_token()}'
+        }
+        body = await self._send(method, path, headers, **kwargs)
+        return json.loads(body) if body else {}
+
+    async def account_url(self):
+        """The account's CDN URL, fetched once."""
+        async with self._account_lock:
+            if not self._account_url:
+                data = await self.request('GET', '/account')
+                self._account_url = format_account_url(data.get('cdnURL') or data.get('cdnTempURL') or "")
+        return self._account_url
+
+    async def search_spins(self, search_query='', max_results=1000, modified_since=None, with_mtime=False):
+        """Filenames of the account's spins matching a search, scrolling past the first page.
+
+        modified_since (an ISO 8601 timestamp) limits the search to spins modified after
+        it. With with_mtime, (filename, mtime) pairs are returned instead of filenames.
+        """
+        payload = {
+            'query': spin_search_query(search_query, modified_since),
+            'sort': {'filename.raw': 'asc'},
+            'from': 0,
+            'size': 100
+        }
+        if max_results > 1000:
+            payload['scroll'] = True
+
+        results = await self.request('POST', '/files/search', data=json.dumps(payload))
+        spins = []
+        while True:
+            for hit in results.get('hits') or []:
+                source = hit.get('_source', {})
+                filename = source.get('filename', '')
+                if filename.endswith('.spin'):
+                    spins.append((filename, source.get('mtime')) if with_mtime else filename)
+            if (not results.get('hits') or 'scrollId' not in results
+                    or len(spins) >= min(max_results, results.get('total', 0))):
+                return spins[:max_results]
+            results = await self.request('POST', '/files/search/scroll',
+                                         data=json.dumps({'scrollId': results['scrollId']}))
+
+    async def prefetch(self, max_results=1000):
+        """Token, account URL and the unfiltered spin listing in one go, for a session's first page."""
+        self._ensure_session()
+        account_url, spins = await asyncio.gather(self.account_url(), self.search_spins(max_results=max_results))
+        return {'account_url': account_url, 'spins': spins}
+
+    async def ensure_folder(self, folder_path):
+        """Check if a folder exists, create it if not (once per client and folder)."""
+        # One lock per folder: rows wait for their own folder, different folders are checked at once
+        async with self._folder_locks.setdefault(folder_path, asyncio.Lock()):
+            if folder_path in self.known_folders:
+                return
+            try:
+                await self.request('GET', '/files/readdir', params={'dirname': folder_path})
+            except SirvError as e:
+                # Only a folder Sirv says isn't there is created, not one Sirv failed to list
+                if is_failure(e.status_code):
+                    raise
+                await self.request('POST', '/files/mkdir', params={'dirname': folder_path})
+            self.known_folders.add(folder_path)
+
+    async def rename(self, from_path, to_path):
+        """Move/rename a file in the Sirv account."""
+        account_url = await self.account_url()
+        if account_url and from_path.startswith(account_url):
+            from_path = from_path.replace(account_url, "")
+        await self.request('POST', '/files/rename', params={'from': from_path, 'to': to_path})
+
+    async def ensure_folders(self, platforms):
+        """Provision the output folders of every platform in a job at once."""
+        self._ensure_session()
+        await asyncio.gather(*(self.ensure_folder(folder) for folder in output_folders(platforms)))
+
+    async def convert(self, platform, spin_path, identifier, spin_number=None):
+        """Convert a spin for a platform and return the URL of the output zip."""
+        problem = identifier_problem(platform, identifier)
+        if problem:
+            raise InvalidIdentifier(problem)
+
+        self._ensure_session()
+        await self.ensure_folder(PLATFORMS[platform]['folder'])
+        path, payload = conversion_request(platform, spin_path, identifier, spin_number)
+        response = await self.request('POST', path, data=json.dumps(payload))
+
+        zip_path = output_path(platform, identifier)
+        await self.rename(response['filename'], zip_path)
+        return f"{await self.account_url()}{zip_path}"
+
+    async def check_result_url(self, url):
+        """HEAD-check a generated zip and describe what was found, see sirv_api.zip_check."""
+        try:
+            async with self._ensure_session().head(url, allow_redirects=True) as response:
+                return zip_check(response.status, response.headers.get('Content-Length'))
+        except Exception as e:
+            return zip_check(error=e)
+
+    async def convert_and_verify(self, platform, spin_path, identifier, spin_number=None, max_defer=600, outage=None):
+        """Convert one row and verify its zip, re-converting broken ones and waiting out open breakers.
+
+        A row failing because one of its endpoints is down waits up to max_defer seconds
+        for a probe to get through; rows of a platform sharing an outage dict (one job)
+        share that deadline, which is lifted again once one of them converts. Returns a result dict with url, error,
+        deferred (gave up waiting for Sirv), duration_s, requeued and the check fields.
+        """
+        result = {'platform': platform, 'spin_path': spin_path, 'identifier': identifier, 'url': None,
+                  'error': '', 'deferred': False, 'requeued': 0,
+                  'http_status': None, 'content_length': None, 'verified': False, 'problem': ''}
+        outage = {} if outage is None else outage
+        start = time.perf_counter()
+        while True:
+            try:
+                result['url'] = await self.convert(platform, spin_path, identifier, spin_number)
+                outage.pop(platform, None)
+                result.update(await self.check_result_url(result['url']))
+                if result['verified'] or result['requeued'] >= VERIFY_RETRIES:
+                    break
+                # Re-queue the broken zip and give the CDN a moment before checking again
+                result['requeued'] += 1
+                await asyncio.sleep(VERIFY_RETRY_DELAY)
+            except Exception as e:
+                # Only a row failing because one of its own endpoints is down waits for a probe
+                # to get through, any other error fails it
+                if not (self.breakers and self.breakers.is_outage(self.client_id, e)):
+                    result['error'] = str(e)
+                    break
+                deadline = outage.setdefault(platform, time.monotonic() + max_defer)
+                retry_in = self.breakers.seconds_until_probe(self.client_id, conversion_endpoints(platform))
+                if time.monotonic() + retry_in >= deadline:
+                    result['error'] = f"Sirv did not recover within {max_defer} s: {str(e)}" if max_defer else str(e)
+                    result['deferred'] = True
+                    break
+                await asyncio.sleep(max(retry_in, 1.0))
+        result['duration_s'] = round(time.perf_counter() - start, 2)
+        return result
+
+    async def run_bulk(self, rows, slots=None, concurrency=None, on_start=None, on_result=None, max_defer=600):
+        """Convert and verify bulk rows ({'platform', 'spin_path', 'identifier'}), returning their results in order.
+
+        slots, if given, is called in a worker thread before each row and blocks until
+        the row may start (e.g. a scheduler slot is free); it returns the function
+        that gives the slot back once the row finished. At most concurrency rows are
+        in flight, all of them if None. on_start(index) and on_result(index, result)
+        are called on this loop as rows start and finish.
+        """
+        self._ensure_session()
+        # Every output folder of the job is provisioned once; if that fails (e.g. Sirv is
+        # down) each row checks its own folder again
+        try:
+            await self.ensure_folders([row['platform'] for row in rows])
+        except Exception:
+            pass
+        limit = asyncio.Semaphore(concurrency) if concurrency else None
+        outage = {}
+
+        async def run_row(index, row, release):
+            try:
+                result = await self.convert_and_verify(row['platform'], row['spin_path'], row['identifier'],
+                                                       max_defer=max_defer, outage=outage)
+            finally:
+                if release:
+                    release()
+                if limit:
+                    limit.release()
+            if on_result:
+                on_result(index, result)
+            return result
+
+        # Rows start in order, one slot at a time, so a single thread waits on the scheduler
+        tasks = []
+        for index, row in enumerate(rows):
+            if limit:
+                await limit.acquire()
+            release = await asyncio.to_thread(slots) if slots else None
+            if on_start:
+                on_start(index)
+            tasks.append(asyncio.create_task(run_row(index, row, release)))
+        return await asyncio.gather(*tasks)
+
+class SyncSirvFacade:
+    """Blocking wrapper that runs an AsyncSirvClient on its own event loop thread.
+
+    get_token, account_url, search_spins and convert_and_verify wait for the
+    client's coroutine of the same name; start_bulk returns a Future instead.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.on_call = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="sirv-async", daemon=True)
+        self.thread.start()
+
+    def observed(self, on_call):
+        """The same client and loop, calling on_call(endpoint) for every API call made through it."""
+        facade = copy.copy(self)
+        facade.on_call = on_call
+        return facade
+
+    async def _observe(self, coroutine):
+        call_observer.set(self.on_call)
+        return await coroutine
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the client's loop and return a concurrent.futures.Future."""
+        if self.on_call:
+            coroutine = self._observe(coroutine)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, coroutine):
+        """Run a coroutine on the client's loop and wait for its result."""
+        return self.submit(coroutine).result()
+
+    def get_token(self):
+        return self.call(self.client.get_token())
+
+    def account_url(self):
+        return self.call(self.client.account_url())
+
+    def search_spins(self, search_query='', max_results=1000, modified_since=None, with_mtime=False):
+        return self.call(self.client.search_spins(search_query, max_results, modified_since, with_mtime))
+
+    def convert_and_verify(self, platform, spin_path, identifier, spin_number=None, max_defer=600):
+        return self.call(self.client.convert_and_verify(platform, spin_path, identifier, spin_number, max_defer))
+
+    def start_bulk(self, rows, slots=None, concurrency=None, on_start=None, on_result=None, max_defer=600):
+        """Start run_bulk on the client's loop and return its Future right away."""
+        return self.submit(self.client.run_bulk(rows, slots, concurrency, on_start, on_result, max_defer))
+
+    def close(self):
+        self.call(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
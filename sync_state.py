@@ -0,0 +1,113 @@
+"""Per-platform record of converted spin/identifier mappings, used for incremental re-sync.
+
+Each tracked mapping keeps the spin modification time (mtime, as reported by Sirv)
+its last successful conversion was made from. A re-sync only converts mappings
+whose spin has been modified since. Stored in the job queue database.
+"""
+import time
+import sqlite3
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from job_queue import DEFAULT_DB_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_mappings (
+    account TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    spin_path TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    last_converted_mtime TEXT,
+    last_converted_at REAL,
+    PRIMARY KEY (account, platform, spin_path, identifier)
+);
+"""
+
+def utc_now_mtime():
+    """The current time in the mtime format Sirv uses, e.g. 2024-05-01T10:00:00.000Z."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+def parse_mtime(value):
+    """Parse a Sirv mtime string into an aware datetime."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class SyncState:
+    """Tracked mappings per account and platform."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def track(self, account, platform, rows):
+        """Start tracking mappings of {'spin_path', 'identifier'}; known ones are kept as they are.
+
+        A row's own 'platform' overrides the given one, as for JobQueue.enqueue_job.
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO sync_mappings (account, platform, spin_path, identifier) VALUES (?, ?, ?, ?)",
+                [(account, row.get('platform', platform), row['spin_path'], row['identifier']) for row in rows]
+            )
+
+    def mark_converted(self, account, platform, spin_path, identifier, mtime):
+        """Record that a tracked mapping was converted from the spin as of mtime."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sync_mappings SET last_converted_mtime = ?, last_converted_at = ? "
+                "WHERE account = ? AND platform = ? AND spin_path = ? AND identifier = ?",
+                (mtime, time.time(), account, platform, spin_path, identifier)
+            )
+
+    def mappings(self, account, platform):
+        """All tracked mappings of an account for one platform."""
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT * FROM sync_mappings WHERE account = ? AND platform = ? ORDER BY spin_path",
+                (account, platform)
+            )]
+
+    def platforms(self, account):
+        """Number of tracked mappings per platform for an account."""
+        with self._connect() as conn:
+            return {row['platform']: row['count'] for row in conn.execute(
+                "SELECT platform, COUNT(*) AS count FROM sync_mappings WHERE account = ? GROUP BY platform",
+                (account,)
+            )}
+
+    def forget(self, account, platform):
+        """Stop tracking every mapping of a platform."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sync_mappings WHERE account = ? AND platform = ?", (account, platform))
+
+def find_changed_mappings(mappings, spin_mtimes):
+    """Mappings whose spin was modified after its last conversion, or was never converted.
+
+    spin_mtimes maps spin paths to their current mtime; mappings whose spin isn't
+    in it are unchanged (or the spin is gone). Each returned mapping gets an 'mtime'.
+    """
+    changed = []
+    for mapping in mappings:
+        mtime = spin_mtimes.get(mapping['spin_path'])
+        if not mtime:
+            continue
+        last = mapping['last_converted_mtime']
+        if last is None or parse_mtime(mtime) > parse_mtime(last):
+            changed.append(dict(mapping, mtime=mtime))
+    return changed
+
+def resync_watermark(mappings):
+    """The time to search for modified spins from, or None when some mapping was never converted."""
+    watermarks = [mapping['last_converted_mtime'] for mapping in mappings]
+    if not watermarks or None in watermarks:
+        return None
+    return min(watermarks, key=parse_mtime)
@@ -0,0 +1,137 @@
+"""Background worker that converts bulk rows from the shared job queue.
+
+Start as many as you like, on this host or on any host that can open the queue database:
+
+    python worker.py --db /shared/sirv_jobs.db
+
+Each worker converts rows for the Sirv account in SIRV_CLIENT_ID / SIRV_CLIENT_SECRET
+(environment or .env). Rows stay leased while a worker holds them; if the worker
+dies, the lease runs out and another worker picks the row up.
+"""
+import os
+import signal
+import socket
+import logging
+import argparse
+import threading
+from dotenv import load_dotenv, find_dotenv
+
+# Load .env before the modules below read their settings (SIRV_QUEUE_DB, SIRV_BREAKER_*, ...)
+dotenv_path = find_dotenv(raise_error_if_not_found=False)
+if dotenv_path:
+    load_dotenv(dotenv_path)
+
+from job_queue import JobQueue, DEFAULT_DB_PATH, DEFAULT_LEASE_SECONDS
+from sync_state import SyncState
+from api_stats import ApiStats
+from circuit_breaker import BreakerBoard
+from sirv_api import identifier_problem, conversion_endpoints
+from sirv_async import AsyncSirvClient, SyncSirvFacade
+
+log = logging.getLogger("sirv-worker")
+
+class LeaseKeeper(threading.Thread):
+    """Keeps extending a row's lease while a slow conversion is running."""
+
+    def __init__(self, queue, row_id, worker_id, lease_seconds):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.row_id = row_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(self.row_id, self.worker_id, self.lease_seconds):
+                log.warning("Lost the lease on row %s", self.row_id)
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+def process_row(queue, sync_state, client, row, worker_id, lease_seconds):
+    """Convert one claimed row on the client (a SyncSirvFacade) and record the outcome in the queue.
+
+    Returns True if the row was deferred because one of its endpoints is down.
+    """
+    problem = identifier_problem(row['platform'], row['identifier'])
+    if problem:
+        # The platform will never accept it, retrying is pointless
+        queue.fail(row['id'], worker_id, problem, retry=False)
+        log.warning("Row %s rejected: %s", row['id'], problem)
+        return False
+
+    keeper = LeaseKeeper(queue, row['id'], worker_id, lease_seconds)
+    keeper.start()
+    try:
+        # The queue defers rows while Sirv is down, so the client doesn't wait for it
+        result = client.convert_and_verify(row['platform'], row['spin_path'], row['identifier'], max_defer=0)
+    finally:
+        keeper.stop()
+
+    if result['deferred']:
+        # Failures of an endpoint that is down are Sirv's, not the row's: don't use up its attempts
+        queue.defer(row['id'], worker_id)
+        log.warning("Row %s deferred: %s", row['id'], result['error'])
+        return True
+    if result['error']:
+        queue.fail(row['id'], worker_id, result['error'])
+        log.warning("Row %s failed (attempt %s): %s", row['id'], row['attempts'], result['error'])
+    elif not result['verified']:
+        # Already re-converted VERIFY_RETRIES times, like a flagged row of an in-app run
+        queue.fail(row['id'], worker_id, f"Verification failed: {result['problem']}", retry=False)
+        log.warning("Row %s (%s) failed verification: %s", row['id'], row['identifier'], result['problem'])
+    else:
+        if queue.complete(row['id'], worker_id, result['url'], result['content_length']) and row['source_mtime']:
+            # Move the re-sync watermark if this mapping is tracked
+            sync_state.mark_converted(client.client.client_id, row['platform'], row['spin_path'],
+                                      row['identifier'], row['source_mtime'])
+        log.info("Row %s (%s) converted: %s", row['id'], row['identifier'], result['url'])
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert bulk rows from the shared Sirv job queue.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the queue database")
+    parser.add_argument("--lease", type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="Seconds a claimed row stays reserved without a heartbeat")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    client_id = os.getenv("SIRV_CLIENT_ID", "")
+    client_secret = os.getenv("SIRV_CLIENT_SECRET", "")
+    if not client_id or not client_secret:
+        parser.error("SIRV_CLIENT_ID and SIRV_CLIENT_SECRET must be set")
+
+    queue = JobQueue(args.db)
+    sync_state = SyncState(args.db)
+    breakers = BreakerBoard()
+    client = SyncSirvFacade(AsyncSirvClient(client_id, client_secret, stats=ApiStats(args.db), breakers=breakers))
+
+    # Finish the current row before exiting on Ctrl+C / SIGTERM
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    log.info("Worker %s polling %s", args.worker_id, args.db)
+    while not stopping.is_set():
+        row = queue.claim(args.worker_id, client_id, args.lease)
+        if row is None:
+            if args.once:
+                break
+            stopping.wait(args.poll)
+            continue
+        if process_row(queue, sync_state, client, row, args.worker_id, args.lease):
+            # The deferred row is claimed again first: wait until its endpoints let a probe through
+            wait = breakers.seconds_until_probe(client_id, conversion_endpoints(row['platform']))
+            log.info("Sirv endpoint circuit open, pausing %.0f s", wait)
+            stopping.wait(max(wait, 1.0))
+    client.close()
+    log.info("Worker %s stopped", args.worker_id)
+
+if __name__ == "__main__":
+    main()